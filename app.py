@@ -1,13 +1,24 @@
-import os, re, html, io, collections, json
+import os, html, hashlib, collections, json, threading, time, zlib
 from pathlib import Path
-from flask import Flask, request, Response, render_template_string, send_file
+from flask import Flask, request, Response, jsonify, make_response, render_template_string, stream_with_context
+from werkzeug.http import is_resource_modified
 from datetime import datetime, timezone
+from urllib.parse import urlencode
 from watchlog_lite.services.logs import (
-    list_hosts, list_months, tail_file, apply_filters, summarize, pick_log_path, parse_kv, BASE as LOG_BASE
+    list_hosts, list_months, tail_file, tail_file_cached, tail_cache_offset, tail_matching, read_matching_after, read_time_range, pick_log_path, is_archive, as_records, BASE as LOG_BASE
 )
-from watchlog_lite.services.ui import pretty_header, fold_dupes
-from watchlog_lite.services.detect import analyze_suspicious, summarize_bittorrent
+from watchlog_lite.services.ui import header_html, age_chip, fold_dupes, hosts_version
+from watchlog_lite.services.analytics import analyze
+from watchlog_lite.services.rollup import load_rollup, update_rollup, minute_range, MONTH_MINUTES
 from watchlog_lite.services.format import pretty_line
+from watchlog_lite.services.query import compile_query
+from watchlog_lite.services.lineindex import read_lines
+from watchlog_lite.services.search import search_file, analyze_file
+from watchlog_lite.services.tail import iter_tail, read_appended, complete_end
+from watchlog_lite.services.archive import archive_size
+from watchlog_lite.services.api import (
+    encode_cursor, decode_cursor, record_json, suspicious_json, OLDER, NEWER
+)
 
 USER = os.getenv("WATCHLOG_USER", "admin")
 PASS = os.getenv("WATCHLOG_PASS", "changeme")
@@ -55,6 +66,7 @@ LAYOUT = """
  .box{background:#0f172a;border:1px solid #223054;border-radius:12px;padding:12px}
  .lines{font-family:ui-monospace,SFMono-Regular,Menlo,Monaco,Consolas,"Liberation Mono","Courier New",monospace}
  .line{margin:2px 0}
+ .win{display:block}
  .muted{color:#94a3b8}
  .chip{display:inline-block;padding:2px 6px;border-radius:6px;margin-left:6px;background:#334155;color:#cbd5e1}
  .chip.port{background:#1f2a44}
@@ -71,6 +83,10 @@ LAYOUT = """
  .popover{position:absolute;left:0;top:40px;z-index:60;display:none;max-width:540px;background:#0f172a;border:1px solid #223054;border-radius:12px;padding:12px;box-shadow:0 10px 30px rgba(2,6,23,.6)}
  .popover.open{display:block}
  .overlay{position:fixed;inset:0;background:rgba(2,6,23,.8);color:#e2e8f0;display:none;align-items:center;justify-content:center;z-index:50}
+ svg.chart{background:#0f172a;border:1px solid #223054;border-radius:12px;width:100%;height:180px}
+ svg.chart rect.t{fill:#324e86}
+ svg.chart rect.d{fill:#ef4444}
+ svg.chart rect.b{fill:#f59e0b}
  .overlay .panel{background:#0f172a;border:1px solid #223054;border-radius:12px;padding:16px;max-width:680px}
 </style>
 <div class="wrap">
@@ -83,6 +99,265 @@ LAYOUT = """
 
 """Helper functions live in watchlog_lite.services.* modules."""
 
+# Dashboard: log bytes a page view may index before rendering (the rest is left to tools/rollup.py)
+ROLLUP_CATCHUP = int(os.getenv("WATCHLOG_ROLLUP_CATCHUP", str(16 << 20)))
+
+# Live follow (/stream): default poll interval and lifetime of one SSE connection.
+# The browser reconnects and resumes from Last-Event-ID; the lifetime stays below
+# gunicorn's default 30 s worker timeout (see systemd/watchlog-lite.service.example)
+STREAM_POLL = float(os.getenv("WATCHLOG_STREAM_POLL", "2"))
+STREAM_MAX_SECONDS = int(os.getenv("WATCHLOG_STREAM_MAX_SECONDS", "25"))
+
+# Rendered line fragments kept across requests (see _render_line)
+RENDER_CACHE_SIZE = int(os.getenv("WATCHLOG_RENDER_CACHE", "50000"))
+
+# Views with more rows than RENDER_WINDOW render in windows of that many rows;
+# WINDOW_RESULTS filtered results are kept for the /window requests
+RENDER_WINDOW = int(os.getenv("WATCHLOG_RENDER_WINDOW", "500"))
+WINDOW_RESULTS = int(os.getenv("WATCHLOG_WINDOW_RESULTS", "16"))
+
+def _mark(regex, txt):
+    return regex.sub(lambda m: f"<mark>{html.escape(m.group(0))}</mark>", txt) if regex else txt
+
+_RENDER_CACHE: "collections.OrderedDict[tuple, object]" = collections.OrderedDict()
+_RENDER_LOCK = threading.Lock()
+
+def _render_line(view, rec, hosts_ver, regex):
+    """HTML for one line in view, cached by (view, line text, hosts.yaml version, highlight).
+
+    chips: (header without age, ts, dport, marked text); pretty/raw: the finished row.
+    """
+    key = (view, rec.raw, hosts_ver, regex)
+    with _RENDER_LOCK:
+        frag = _RENDER_CACHE.get(key)
+        if frag is not None:
+            _RENDER_CACHE.move_to_end(key)
+            return frag
+    if view == "raw":
+        frag = _mark(regex, html.escape(rec.raw))
+    elif view == "chips":
+        frag = header_html(rec), rec.ts, rec.dport, _mark(regex, html.escape(rec.raw))
+    else:
+        frag = pretty_line(rec)
+        if regex:
+            frag = frag + f"<div class='muted'>{_mark(regex, html.escape(rec.raw))}</div>"
+    with _RENDER_LOCK:
+        _RENDER_CACHE[key] = frag
+        while len(_RENDER_CACHE) > RENDER_CACHE_SIZE:
+            _RENDER_CACHE.popitem(last=False)
+    return frag
+
+def _row_items(lines, view):
+    """(record, ×N suffix) per displayed row; consecutive duplicates fold except in raw view."""
+    return [(rec, "") for rec in lines] if view == "raw" else fold_dupes(lines)
+
+def render_rows(lines, view, regex, link_base):
+    """HTML rows for records in view (raw/pretty/chips); joined with "\n" by callers.
+
+    link_base is the current page URL without q, used for the dport chips.
+    """
+    return render_items(_row_items(lines, view), view, regex, link_base)
+
+def render_items(items, view, regex, link_base):
+    """HTML for (record, suffix) rows from _row_items().
+
+    Line fragments come from _render_line(), so a refresh renders only
+    lines it has not seen and repeated lines cost one lookup.
+    """
+    if view == "raw":
+        return [_render_line("raw", rec, None, regex) for rec, _ in items]
+    parts = []
+    hv = hosts_version()
+    if view == "chips":
+        ages = {}  # ts -> age chip, for this request only
+        for kv, suf in items:
+            header, ts, dp, txt = _render_line("chips", kv, hv, regex)
+            age = ages.get(ts)
+            if age is None:
+                age = ages[ts] = age_chip(ts)
+            dpc = ""
+            if dp is not None:
+                dpc = f'<a class="chip port" href="{link_base}&q=dport={dp}">dport {dp}</a>'
+            parts.append(f'<div class="line">{header}{age}{dpc}{suf}<div class="muted">{txt}</div></div>')
+        return parts
+    for rec, suf in items:  # pretty
+        parts.append(_render_line("pretty", rec, None, regex) + " " + suf)
+    return parts
+
+# Windowed results: the filtered rows of a large view, by result id (see
+# _result_id). The page renders the first RENDER_WINDOW rows and /window
+# serves further chunks of the same rows as the user scrolls.
+_WINDOWS: "collections.OrderedDict[str, tuple]" = collections.OrderedDict()
+_WINDOW_LOCK = threading.Lock()
+_WINDOW_ARGS = ("rid", "start", "count", "pos")
+
+def _result_id(log_path):
+    """Id of the rows this request selects: the log's identity plus the page args, or None."""
+    try:
+        st = os.stat(log_path)
+    except FileNotFoundError:
+        return None
+    args = sorted((k, v) for k, v in request.args.items(multi=True) if k not in _WINDOW_ARGS)
+    key = repr((str(log_path), st.st_ino, st.st_size, st.st_mtime_ns, args))
+    return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+def _store_result(rid, items):
+    """Keep (raw lines, suffixes) of items under rid; returns them."""
+    res = ([rec.raw for rec, _ in items], [suf for _, suf in items])
+    with _WINDOW_LOCK:
+        _WINDOWS[rid] = res
+        while len(_WINDOWS) > WINDOW_RESULTS:
+            _WINDOWS.popitem(last=False)
+    return res
+
+def _cached_result(rid):
+    with _WINDOW_LOCK:
+        res = _WINDOWS.get(rid)
+        if res is not None:
+            _WINDOWS.move_to_end(rid)
+        return res
+
+def _code_version():
+    """(id, newest mtime_ns) of the code this process loaded: app.py and watchlog_lite/**/*.py."""
+    root = Path(__file__).resolve().parent
+    h = hashlib.blake2b(digest_size=8)
+    newest = 0
+    for f in [root / "app.py", *sorted((root / "watchlog_lite").rglob("*.py"))]:
+        st = f.stat()
+        h.update(f"{f.relative_to(root)}:{st.st_size}:{st.st_mtime_ns};".encode())
+        newest = max(newest, st.st_mtime_ns)
+    return h.hexdigest(), newest
+
+# part of every validator, so a deploy that changes any rendering/query code invalidates cached pages
+_APP_VERSION, _APP_MTIME = _code_version()
+
+def _validators(log_path, *extra):
+    """(strong ETag, Last-Modified) for a response built from log_path and the request args.
+
+    The ETag hashes the log's inode/size/mtime, the normalized query args,
+    the hosts.yaml version, the code version and extra; Last-Modified is
+    the newest of the log's, hosts.yaml's and the code's mtimes. None if
+    the log is missing.
+    """
+    try:
+        st = os.stat(log_path)
+    except FileNotFoundError:
+        return None
+    hv = hosts_version()
+    args = sorted((k, v.strip()) for k, v in request.args.items(multi=True) if v.strip())
+    key = repr((_APP_VERSION, str(log_path), st.st_ino, st.st_size, st.st_mtime_ns, args, hv,
+                request.headers.get("X-Forwarded-Prefix", "/"), extra))
+    etag = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    mtime = max(st.st_mtime_ns, hv[0] if hv else 0, _APP_MTIME) / 1e9
+    # a write later in the same second would not move Last-Modified: leave it out until then
+    last_modified = datetime.fromtimestamp(mtime, timezone.utc) if time.time() - mtime >= 1 else None
+    return etag, last_modified
+
+def _not_modified(validators):
+    """A 304 response if the request's If-None-Match / If-Modified-Since still match, else None."""
+    if validators is None:
+        return None
+    etag, last_modified = validators
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return _with_validators(Response(status=304), validators)
+
+def _with_validators(resp, validators):
+    """Set ETag / Last-Modified on resp; clients revalidate before reusing it."""
+    if validators is not None:
+        etag, last_modified = validators
+        resp.set_etag(etag)
+        if last_modified is not None:
+            resp.last_modified = last_modified
+        resp.cache_control.private = True
+        resp.cache_control.no_cache = True
+    return resp
+
+def _n_arg():
+    """Lines per view (n=), 1..50000."""
+    try:
+        return max(1, min(50000, int(request.args.get("n", "2000"))))
+    except ValueError:
+        return 2000
+
+def _view_link_base(prefix, host, ym):
+    """Page URL without q for the current view args (dport chips)."""
+    a = request.args.get
+    return (f"{prefix}?host={host}&ym={ym}&n={_n_arg()}&view={a('view', 'pretty')}&wrap={a('wrap', '1')}"
+            f"&refresh={a('refresh', '0')}&hide_dns={a('hide_dns', '0')}&hide_bcast={a('hide_bcast', '0')}")
+
+def _full_query(q):
+    """q plus the optional noise toggles (hide_dns / hide_bcast)."""
+    q_full = q
+    if request.args.get("hide_dns", "0") == "1":
+        q_full = (q_full + " dport!=53").strip()
+    if request.args.get("hide_bcast", "0") == "1":
+        q_full = (q_full + " -dst_ip=224. -dst_ip=239. -dst_ip=255.255.255.255").strip()
+    return q_full
+
+def _file_not_found(log_path):
+    body = f"<p>File not found: <code>{html.escape(str(log_path))}</code></p>"
+    return render_template_string(LAYOUT, content=body)
+
+def _page_offset(n):
+    """First line (0-based) requested via offset= or page= (1-based, n lines per page)."""
+    offset = _offset_arg("offset")
+    page = _offset_arg("page")
+    if offset is None and page:
+        offset = (page - 1) * n
+    return offset
+
+def _offset_arg(name):
+    """Non-negative integer query arg (byte offsets/cursors), or None."""
+    try:
+        v = int(request.args.get(name, ""))
+    except ValueError:
+        return None
+    return v if v >= 0 else None
+
+def _select_lines(log_path, n, q_full):
+    """Records for the requested slice: time window, page, matching lines or plain tail.
+
+    Returns (records, total lines read, before= cursor, truncated) or None if
+    the log is missing.
+    """
+    mode = request.args.get("mode", "tail")
+    offset = _page_offset(n)
+    since = request.args.get("since", "").strip()
+    until = request.args.get("until", "").strip()
+    cursor = None
+    truncated = False
+    if since or until:
+        # time window located by binary search on byte offsets
+        res = read_time_range(log_path, since, until, n)
+        if res is None:
+            return None
+        window, truncated = res
+        lines = compile_query(q_full).filter(as_records(window))
+        total = len(window)
+    elif offset is not None:
+        # random-access window through the sidecar line index
+        res = read_lines(log_path, offset, n)
+        if res is None:
+            return None
+        page_lines, total = res
+        lines = compile_query(q_full).filter(as_records(page_lines))
+    elif mode == "match":
+        # filter while reading backwards until n lines match (bounded scan)
+        res = tail_matching(log_path, n, q_full, _offset_arg("before"))
+        if res is None:
+            return None
+        matched, cursor, total = res
+        lines = as_records(matched)
+    else:
+        lines_all = tail_file_cached(log_path, n)
+        if lines_all is None:
+            return None
+        # one lazily-parsed record per line, shared by filters, panels and views
+        lines = compile_query(q_full).filter(as_records(lines_all))
+        total = len(lines_all)
+    return lines, total, cursor, truncated
+
 @app.get("/")
 @requires_auth
 def index():
@@ -98,46 +373,40 @@ def index():
         return render_template_string(LAYOUT, content=body)
 
     ym = request.args.get("ym", months[-1])
-    try:
-        n = max(1, min(50000, int(request.args.get("n", "2000"))))
-    except ValueError:
-        n = 2000
+    n = _n_arg()
     q = request.args.get("q", "").strip()
     view = request.args.get("view", "pretty")
     wrap = request.args.get("wrap", "1")
     refresh = request.args.get("refresh", "0")
     hide_dns = request.args.get("hide_dns", "0")
     hide_bcast = request.args.get("hide_bcast", "0")
-    regex = None
-    if q:
-        try:
-            terms = [t for t in re.split(r'[| ]+', q) if t]
-            rx_terms = [t for t in terms if '=' not in t]
-            if rx_terms:
-                regex = re.compile("|".join(rx_terms), re.I)
-        except re.error:
-            regex = None
+    mode = request.args.get("mode", "tail")
+    offset = _page_offset(n)
+    since = request.args.get("since", "").strip()
+    until = request.args.get("until", "").strip()
+    # highlight regex comes from the cached plan for q
+    regex = compile_query(q).highlight
 
     # Use X-Forwarded-Prefix when behind nginx; default to root for direct access
     prefix = request.headers.get("X-Forwarded-Prefix", "/")
     if not prefix.endswith("/"):
         prefix += "/"
 
-    log_path = pick_log_path(host, ym)
-    lines_all = tail_file(log_path, n)
-    if lines_all is None:
-        body = f"<p>File not found: <code>{html.escape(str(log_path))}</code></p>"
-        return render_template_string(LAYOUT, content=body)
+    q_full = _full_query(q)
 
-    # Optional noise toggles: augment q
-    q_full = q
-    if request.args.get("hide_dns", "0") == "1":
-        q_full = (q_full + " dport!=53").strip()
-    if request.args.get("hide_bcast", "0") == "1":
-        q_full = (q_full + " -dst_ip=224. -dst_ip=239. -dst_ip=255.255.255.255").strip()
-
-    lines = apply_filters(lines_all, regex, q_full)
-    total, shown = len(lines_all), len(lines)
+    log_path = pick_log_path(host, ym)
+    # an unchanged log (and hosts.yaml, args, host/month lists) answers 304 before
+    # any reading; chips show relative ages, so their tag also turns every minute
+    validators = _validators(log_path, hosts, months, int(time.time() // 60) if view == "chips" else None)
+    resp = _not_modified(validators)
+    if resp is not None:
+        return resp
+    rid = _result_id(log_path)  # before reading, so the id never claims newer lines
+    res = _select_lines(log_path, n, q_full)
+    if res is None:
+        return _file_not_found(log_path)
+    lines, total, cursor, truncated = res
+    shown = len(lines)
 
     # build UI
     opts_host = "".join(
@@ -153,6 +422,11 @@ def index():
         f'<option value="{v}" {"selected" if view==v else ""}>{label}</option>'
         for v,label in view_opts
     )
+    mode_opts = [("tail","lines, then filter"),("match","matching lines")]
+    opts_mode = "".join(
+        f'<option value="{v}" {"selected" if mode==v else ""}>{label}</option>'
+        for v,label in mode_opts
+    )
     refresh_opts = ["0","5","10","30"]
     opts_refresh = "".join(
         f'<option value="{val}" {"selected" if refresh==val else ""}>{"Off" if val=="0" else val+"s"}</option>'
@@ -176,17 +450,23 @@ def index():
     <form class="bar" method="get" action="{prefix}">
       <label>Host <select name="host">{opts_host}</select></label>
       <label>Month <select name="ym">{opts_month}</select></label>
-      <label>Last lines <input type="number" name="n" value="{n}" min="1" max="50000" style="width:110px"></label>
+      <label>Last <input type="number" name="n" value="{n}" min="1" max="50000" style="width:110px"></label>
+      <label><select name="mode">{opts_mode}</select></label>
+      <label>Since <input type="text" name="since" value="{html.escape(since)}" placeholder="YYYY-MM-DD HH:MM" style="width:150px"></label>
+      <label>Until <input type="text" name="until" value="{html.escape(until)}" placeholder="YYYY-MM-DD HH:MM" style="width:150px"></label>
+      <label>Page <input type="number" name="page" value="{(offset // n + 1) if offset is not None else ""}" min="1" placeholder="tail" style="width:80px"></label>
       <label class="rel">Filter (regex ok) <input id="q" type="text" name="q" value="{html.escape(q)}" style="width:260px">
         <a href="#" id="qHelp" class="chip" title="Filter help">?</a>
         <div id="qHelpPop" class="popover"><b>Filter syntax</b><br>
           <ul style="margin:.5rem 0 .25rem 1rem">
             <li>Regex tokens: space or | separated (OR match)</li>
+            <li>Plain words (no ^$*+?{{}}[]\\|() in them) match as text, so "." is a literal dot: <code>10.0.0.1</code></li>
             <li>Negation: -word, or key!=value</li>
             <li>key=value: ip, src_ip, dst_ip, dport, sport, action</li>
-            <li>Ranges: dport=6881-6999 (also sport)</li>
+            <li>Ranges: dport=6881-6999 (also sport); every shown line must be in range</li>
             <li>Combine: regex OR all key=value/ranges; negatives always exclude</li>
-            <li>Aliases: src/src_ip/saddr; dst/dst_ip/daddr; dport/dst_port/dpt; sport/src_port/spt; action/msg/log; ip aliases src_ip</li>
+            <li>Aliases: src/src_ip/saddr; dst/dst_ip/daddr; dport/dst_port/dpt; sport/src_port/spt; ip aliases src_ip; action= also matches msg/log values, msg=/log= only their own key</li>
+            <li>Prefix: a value ending in "." matches a prefix, e.g. <code>-dst_ip=224.</code></li>
           </ul>
           <div class="muted">Examples: <code>bittorrent ip=192.168.1.23</code>, <code>-Deny action!=Allow</code>, <code>dport=51413</code></div>
         </div></label>
@@ -201,41 +481,21 @@ def index():
     """
 
     # Render according to view
-    if view == "raw":
-        txt = html.escape("\n".join(lines))
-        if regex:
-            txt = regex.sub(lambda m: f"<mark>{html.escape(m.group(0))}</mark>", txt)
-        rendered = txt
-    elif view == "chips":
-        parts = []
-        for base, suf in fold_dupes(lines):
-            kv = parse_kv(base)
-            header = pretty_header(kv)
-            dpc = ""
-            if kv.get("dport"):
-                r = refresh
-                hd = hide_dns
-                hb = hide_bcast
-                dp = html.escape(kv["dport"])
-                dpc = f'<a class="chip port" href="{prefix}?host={host}&ym={ym}&n={n}&view={view}&wrap={wrap}&refresh={r}&hide_dns={hd}&hide_bcast={hb}&q=dport={dp}">dport {dp}</a>'
-            txt = html.escape(base)
-            if regex:
-                txt = regex.sub(lambda m: f"<mark>{html.escape(m.group(0))}</mark>", txt)
-            parts.append(f'<div class="line">{header}{dpc}{suf}<div class="muted">{txt}</div></div>')
-        rendered = "\n".join(parts)
-    else:  # pretty
-        parts = []
-        for base, suf in fold_dupes(lines):
-            row = pretty_line(base)
-            if regex:
-                raw = html.escape(base)
-                raw = regex.sub(lambda m: f"<mark>{html.escape(m.group(0))}</mark>", raw)
-                row = row + f"<div class='muted'>{raw}</div>"
-            parts.append(row + " " + suf)
-        rendered = "\n".join(parts)
+    link_base = _view_link_base(prefix, host, ym)
+    items = _row_items(lines, view)
+    n_rows = len(items)
+    windowed = n_rows > RENDER_WINDOW and rid is not None
+    if windowed:
+        # first window only; the script fetches the rest from /window on scroll
+        _store_result(rid, items)
+        items = items[:RENDER_WINDOW]
+    rendered = "\n".join(render_items(items, view, regex, link_base))
+
+    # Panels: all analyzers in one pass over the records
+    panels = analyze(lines)
 
     # Top talkers / ports summary
-    ips, ports = summarize(lines)
+    ips, ports = panels["summary"]
     def mk_table(title, rows, kind):
         r = request.args.get('refresh','0'); hd = request.args.get('hide_dns','0'); hb = request.args.get('hide_bcast','0')
         items = "".join(
@@ -248,7 +508,7 @@ def index():
     summary_html += mk_table("Top dst ports", ports, "dport")
 
     # BitTorrent suspects summary table (top IPs within current slice)
-    bt = summarize_bittorrent(lines)
+    bt = panels["bittorrent"]
     if bt:
         def _mk_ip_link(ip):
             return (f"<a class=\"ip\" href=\"{prefix}?host={host}&ym={ym}&n={n}&view={view}&wrap={wrap}&q={html.escape(ip)}\">{html.escape(ip)}</a>")
@@ -260,7 +520,7 @@ def index():
         bt_html = ''
 
     # Suspicious activity panel
-    sus = analyze_suspicious(lines)
+    sus = panels["suspicious"]
     sus_rows = []
     if sus["bt_count"]:
         ips_html = ", ".join(html.escape(x) for x in sus["bt_ips"][:5])
@@ -269,6 +529,10 @@ def index():
     for sip, cntp in sus["scan_suspects"]:
         link = f"{prefix}?host={host}&ym={ym}&n={n}&view={view}&wrap={wrap}&q=ip={html.escape(sip)}"
         sus_rows.append(f"<tr><td>Port scan suspect</td><td>{cntp} dports</td><td class='muted'>{html.escape(sip)}</td><td><a href='{link}'>filter</a></td></tr>")
+    for burst in panels["scan_window"]:
+        link = f"{prefix}?host={host}&ym={ym}&n={n}&view={view}&wrap={wrap}&q=ip={html.escape(burst['ip'])}"
+        detail = f"{html.escape(burst['ip'])} at {html.escape(burst['peak_at'] or '')}"
+        sus_rows.append(f"<tr><td>Scan burst</td><td>{burst['peak_ports']} dports / {burst['window']}s</td><td class='muted'>{detail}</td><td><a href='{link}'>filter</a></td></tr>")
     for dpt, cnt in sus["risky_ports"]:
         link = f"{prefix}?host={host}&ym={ym}&n={n}&view={view}&wrap={wrap}&q=dport={dpt} action=Allow"
         sus_rows.append(f"<tr><td>Risky port</td><td>{cnt}</td><td class='muted'>dport {dpt} Allow</td><td><a href='{link}'>filter</a></td></tr>")
@@ -278,14 +542,57 @@ def index():
 
     # Download link (preserve query) + counts + copy link
     qs = request.query_string.decode() or ""
-    counts_html = f'<div class="bar"><span class="muted">Showing {shown} / {total}</span> <button type="button" onclick="navigator.clipboard.writeText(location.href)">Copy link</button> <label class="muted"><input type="checkbox" id="pauseRefresh"> Pause</label></div>'
-    download_html = f'<div class="bar"><a href="{prefix}export?{qs}">Download</a></div>'
+    if since or until:
+        rng = f"{html.escape(since or '…')} – {html.escape(until or '…')}"
+        note = f" (first {n} lines; narrow the window or raise n)" if truncated else ""
+        counts_html = f'<div class="bar"><span class="muted">Time window {rng}: {total} lines{note}</span></div>'
+    elif mode == "match":
+        more = ""
+        if cursor:
+            more_qs = urlencode({**request.args.to_dict(), "before": cursor})
+            more = f' <a href="{prefix}?{html.escape(more_qs)}">Continue scanning from offset {cursor}</a>'
+        counts_html = f'<div class="bar"><span class="muted">{shown} matches in {total} scanned lines</span>{more}</div>'
+    elif offset is not None:
+        def _page_link(label, p):
+            args = {k: v for k, v in request.args.items() if k != "offset"}
+            return f' <a href="{prefix}?{html.escape(urlencode({**args, "page": p}))}">{label}</a>'
+        pages = max(1, -(-total // n))
+        cur = offset // n + 1
+        nav = (_page_link("« first", 1) if cur > 1 else "") + (_page_link("‹ prev", cur - 1) if cur > 1 else "")
+        nav += (_page_link("next ›", cur + 1) if cur < pages else "") + (_page_link("last »", pages) if cur < pages else "")
+        counts_html = (f'<div class="bar"><span class="muted">Lines {min(offset + 1, total)}–{min(offset + n, total)} of {total}'
+                       f' (page {cur} / {pages})</span>{nav}</div>')
+    else:
+        counts_html = ""
+    rows_note = f" ({n_rows} rows, rendered as you scroll)" if windowed else ""
+    counts_html += f'<div class="bar"><span class="muted">Showing {shown} / {total}{rows_note}</span> <button type="button" onclick="navigator.clipboard.writeText(location.href)">Copy link</button> <label class="muted"><input type="checkbox" id="pauseRefresh"> Pause</label></div>'
+    search_qs = urlencode({"host": host, "ym": ym, "q": q})
+    month_qs = urlencode({"host": host, "ym": ym, "q": q, "scope": "month", "gz": "1"})
+    download_html = (f'<div class="bar"><a href="{prefix}export?{qs}">Download</a>'
+                     f' <a href="{prefix}export?{html.escape(month_qs)}">Download month (.gz)</a>'
+                     f' <a href="{prefix}search?{html.escape(search_qs)}">Search whole month</a>'
+                     f' <a href="{prefix}dashboard?{html.escape(urlencode({"host": host, "ym": ym}))}">Month dashboard</a></div>')
+    # Live follow (SSE) replaces page reloads for the plain tail of an active log
+    live_attr = ""
+    if refresh != "0" and mode != "match" and offset is None and not (since or until):
+        live_pos = tail_cache_offset(log_path)
+        if live_pos is not None:
+            live_url = f"{prefix}stream?" + urlencode({**request.args.to_dict(), "pos": "%d:%d" % live_pos})
+            live_attr = f' data-live="{html.escape(live_url)}"'
+    tag = "span" if view in ("raw", "pretty") else "div"
+    if windowed:
+        # chunk 0 between spacers that stand in for the rows not in the DOM; no
+        # whitespace between the blocks, which a <pre> would show
+        window_url = f"{prefix}window?" + urlencode({**request.args.to_dict(), "rid": rid})
+        live_attr += (f' data-window="{html.escape(window_url)}" data-total="{n_rows}" data-chunk="{RENDER_WINDOW}"')
+        rendered = (f'<{tag} id="winTop" class="win"></{tag}><{tag} class="win" data-c="0">{rendered}</{tag}>'
+                    f'<{tag} id="winBottom" class="win"></{tag}><{tag} id="liveRows" class="win"></{tag}>')
     if view in ("raw", "pretty"):
         pre_class = "" if wrap == "1" else "nowrap"
         cls = ("pretty " + pre_class).strip() if view == "pretty" else pre_class
-        results_html = f'<pre class="{cls}">' + rendered + "</pre>"
+        results_html = f'<pre id="results" class="{cls}"{live_attr}>' + rendered + "</pre>"
     else:
-        results_html = '<div class="box lines">' + rendered + '</div>'
+        results_html = f'<div id="results" class="box lines"{live_attr}>' + rendered + '</div>'
     saved_html = '<div class="bar"><input type="text" id="saveName" placeholder="Save as..." style="width:160px"><button type="button" id="saveBtn">Save filter</button><span id="savedList"></span></div>'
     r_js = refresh if refresh.isdigit() else "0"
 
@@ -297,9 +604,82 @@ def index():
       var params = new URLSearchParams(location.search);
       var r = parseInt(params.get('refresh') || '0', 10);
       var paused = false;
+      var box = document.getElementById('results');
+      var live = box && box.getAttribute('data-live');
+      var queued = [];
+      function flush() {
+        if (!box || !queued.length) return;
+        var sep = box.tagName === 'PRE' ? '\\n' : '';
+        var tgt = document.getElementById('liveRows') || box;  // windowed: after the last chunk
+        tgt.insertAdjacentHTML('beforeend', (tgt.lastChild ? sep : '') + queued.join(sep));
+        queued = [];
+      }
       var cb = document.getElementById('pauseRefresh');
-      if (cb) cb.addEventListener('change', function () { paused = this.checked; });
-      if (r > 0) { setInterval(function () { if (!paused) location.reload(); }, r * 1000); }
+      if (cb) cb.addEventListener('change', function () { paused = this.checked; if (!paused) flush(); });
+      if (r > 0 && live && window.EventSource) {
+        // append new rows in place; the server only renders appended lines
+        var es = new EventSource(live);
+        es.addEventListener('rows', function (ev) { queued.push(JSON.parse(ev.data).html); if (!paused) flush(); });
+      } else if (r > 0) { setInterval(function () { if (!paused) location.reload(); }, r * 1000); }
+
+      // Windowed results: chunks of rows around the viewport are fetched from
+      // /window and far-away ones swapped for spacers, so the DOM stays small
+      var win = box && box.getAttribute('data-window');
+      if (win) (function () {
+        var size = +box.getAttribute('data-chunk'), total = +box.getAttribute('data-total');
+        var last = Math.ceil(total / size) - 1, keep = 4, margin = 2 * innerHeight;
+        var tag = box.tagName === 'PRE' ? 'span' : 'div';
+        var top = document.getElementById('winTop'), bottom = document.getElementById('winBottom');
+        var heights = {}, busy = false;
+        function chunk(c) { return box.querySelector('[data-c="' + c + '"]'); }
+        function loaded() { return [].map.call(box.querySelectorAll('[data-c]'), function (el) { return +el.getAttribute('data-c'); }); }
+        function rowH() {  // measured height per row, for chunks not seen yet
+          var h = 0, n = 0; for (var c in heights) { h += heights[c]; n += Math.min(size, total - c * size); }
+          return n ? h / n : 16;
+        }
+        function span(from, to) { var h = 0, r = rowH(); for (var c = from; c <= to; c++) h += heights[c] || r * Math.min(size, total - c * size); return h; }
+        function layout() {
+          var cs = loaded();
+          top.style.height = (cs.length ? span(0, cs[0] - 1) : 0) + 'px';
+          bottom.style.height = (cs.length ? span(cs[cs.length - 1] + 1, last) : 0) + 'px';
+        }
+        function drop(c) { var el = chunk(c); heights[c] = el.offsetHeight; el.remove(); }
+        function load(c) {
+          busy = true;
+          fetch(win + '&start=' + c * size + '&count=' + size, {credentials: 'same-origin'})
+            .then(function (r) { if (!r.ok) throw r.status; return r.json(); })
+            .then(function (d) {
+              var cs = loaded(), el = document.createElement(tag);
+              el.className = 'win'; el.setAttribute('data-c', c); el.innerHTML = d.html;
+              var up = cs.length && c < cs[0];
+              if (up) top.after(el); else bottom.before(el);
+              heights[c] = el.offsetHeight;
+              if (cs.length >= keep) drop(up ? cs[cs.length - 1] : cs[0]);
+              layout(); busy = false; check();
+            })
+            .catch(function (status) {
+              if (status === 410) bottom.insertAdjacentHTML('beforebegin', '<' + tag + ' class="win muted">The log changed since this page was loaded: reload to see the rest.</' + tag + '>');
+              else busy = false;
+            });
+        }
+        function check() {
+          if (busy) return;
+          var cs = loaded(), y = -top.getBoundingClientRect().top;  // viewport top within the rows
+          var lo = chunk(cs[0]).getBoundingClientRect(), hi = chunk(cs[cs.length - 1]).getBoundingClientRect();
+          if ((lo.top > innerHeight + margin && y > 0) || (hi.bottom < -margin && bottom.getBoundingClientRect().bottom > 0)) {
+            // jumped (scrollbar drag): replace the loaded chunks with the one under the viewport
+            var c = 0, h = 0;
+            while (c < last && (h += heights[c] || rowH() * size) <= y) c++;
+            cs.forEach(drop);
+            top.style.height = span(0, c - 1) + 'px'; bottom.style.height = span(c, last) + 'px';
+            load(c);
+          } else if (cs[cs.length - 1] < last && hi.bottom < innerHeight + margin) load(cs[cs.length - 1] + 1);
+          else if (cs[0] > 0 && lo.top > -margin) load(cs[0] - 1);
+        }
+        addEventListener('scroll', check, {passive: true});
+        addEventListener('resize', check);
+        layout(); check();
+      })();
 
       // Saved filters
       var qEl = document.getElementById('q');
@@ -361,7 +741,7 @@ def index():
 
 
     content = form + saved_html + bt_html + summary_html + counts_html + download_html + results_html + script
-    return render_template_string(LAYOUT, content=content)
+    return _with_validators(make_response(render_template_string(LAYOUT, content=content)), validators)
 
 @app.get("/export")
 @requires_auth
@@ -375,27 +755,448 @@ def export():
     if not months:
         return Response("No months", 404)
     ym = request.args.get("ym", months[-1])
+    n = _n_arg()
+    q = request.args.get("q", "").strip()
+
+    log_path = pick_log_path(host, ym)
+    validators = _validators(log_path, hosts, months)
+    resp = _not_modified(validators)
+    if resp is not None:
+        return resp
+    offset = _page_offset(n)
+    since = request.args.get("since", "").strip()
+    until = request.args.get("until", "").strip()
+    plan = compile_query(q)
+    if request.args.get("scope") == "month":
+        # whole filtered month, streamed batch by batch from the search pool
+        if not log_path.exists():
+            return Response("File not found", 404)
+        batches = search_file(log_path, q)
+    elif since or until:
+        batches = [plan.filter((read_time_range(log_path, since, until, n) or ([],))[0])]
+    elif offset is not None:
+        batches = [plan.filter((read_lines(log_path, offset, n) or ([],))[0])]
+    elif request.args.get("mode") == "match":
+        batches = [(tail_matching(log_path, n, q, _offset_arg("before")) or ([],))[0]]
+    elif log_path.exists() and not is_archive(log_path):
+        batches = _line_batches(ln for ln in iter_tail(log_path, n) if plan.match(ln))
+    else:
+        batches = [plan.filter(tail_file(log_path, n) or [])]
+
+    def generate():
+        for batch in batches:
+            if batch:
+                yield ("\n".join(batch) + "\n").encode("utf-8", "ignore")
+
+    name = "watchguard.txt"
+    body = generate()
+    if request.args.get("gz") == "1":
+        name += ".gz"
+        body = _gzip_chunks(body)
+    headers = {"Content-Disposition": f"attachment; filename={name}"}
+    mimetype = "application/gzip" if name.endswith(".gz") else "text/plain"
+    resp = Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+    return _with_validators(resp, validators)
+
+def _line_batches(lines, batch_bytes=64 * 1024):
+    """Group a line stream into lists of ~batch_bytes, so each response chunk carries many lines."""
+    batch, size = [], 0
+    for ln in lines:
+        batch.append(ln)
+        size += len(ln) + 1
+        if size >= batch_bytes:
+            yield batch
+            batch, size = [], 0
+    if batch:
+        yield batch
+
+def _gzip_chunks(chunks, flush_every=256 * 1024):
+    """Gzip a byte stream on the fly, emitting compressed output every ~flush_every input bytes."""
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)
+    pending = 0
+    for chunk in chunks:
+        out = z.compress(chunk)
+        pending += len(chunk)
+        if pending >= flush_every:
+            out += z.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if out:
+            yield out
+    yield z.flush()
+
+def _stream_cursor(s):
+    """(inode, offset) from a /stream event id or pos= ("inode:offset"), or None."""
+    ino, _, pos = s.partition(":")
+    return (int(ino), int(pos)) if ino.isdigit() and pos.isdigit() else None
+
+@app.get("/stream")
+@requires_auth
+def stream():
+    """Server-Sent Events: follow the log and push rendered rows for appended lines."""
+    hosts = list_hosts()
+    if not hosts:
+        return Response("No logs", 404)
+    host = request.args.get("host", hosts[-1])
+    months = list_months(host)
+    if not months:
+        return Response("No months", 404)
+    ym = request.args.get("ym", months[-1])
+    log_path = pick_log_path(host, ym)
+    if not log_path.exists() or is_archive(log_path):
+        return Response("Not a live log", 404)
+    q = request.args.get("q", "").strip()
+    plan = compile_query(_full_query(q))
+    regex = compile_query(q).highlight
+    view = request.args.get("view", "pretty")
+    refresh = request.args.get("refresh", "5")
+    poll = max(1, int(refresh)) if refresh.isdigit() else STREAM_POLL
+    prefix = request.headers.get("X-Forwarded-Prefix", "/")
+    if not prefix.endswith("/"):
+        prefix += "/"
+    keep = ("n", "wrap", "refresh", "hide_dns", "hide_bcast")
+    link_base = f"{prefix}?" + urlencode({"host": host, "ym": ym, "view": view,
+                                         **{k: request.args[k] for k in keep if k in request.args}})
+    # resume after a reconnect from the last delivered "inode:offset"
+    cur = _stream_cursor(request.headers.get("Last-Event-ID", "")) or _stream_cursor(request.args.get("pos", ""))
+    st = os.stat(log_path)
+    if cur is None:
+        pos = st.st_size
+    elif cur[0] != st.st_ino or cur[1] > st.st_size:
+        pos = 0  # rotated or truncated since: the new file from its start
+    else:
+        pos = cur[1]
+    sep = "\n" if view in ("raw", "pretty") else ""
+
+    def generate(pos=pos, ino=st.st_ino):
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        yield "retry: 3000\n\n"
+        while time.monotonic() < deadline:
+            try:
+                st = os.stat(log_path)
+            except FileNotFoundError:
+                return
+            if st.st_ino != ino or st.st_size < pos:
+                ino, pos = st.st_ino, 0  # rotated or truncated: follow the new file
+            lines = []
+            if st.st_size > pos:
+                lines, pos = read_appended(log_path, pos)  # a trailing partial line waits
+            if lines:
+                rows = render_rows(plan.filter(as_records(lines)), view, regex, link_base)
+                if rows:
+                    yield f"id: {ino}:{pos}\nevent: rows\ndata: {json.dumps({'html': sep.join(rows)})}\n\n"
+                else:
+                    yield f"id: {ino}:{pos}\n\n"
+                if st.st_size > pos:
+                    continue  # still behind: keep reading without sleeping
+            else:
+                yield ": idle\n\n"
+            time.sleep(max(0.0, min(poll, deadline - time.monotonic())))
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers)
+
+@app.get("/window")
+@requires_auth
+def window():
+    """Rendered rows [start, start + count) of a windowed page's result (JSON).
+
+    Takes the page's args plus rid= from data-window. A result missing from
+    this process (evicted, or served by another worker) is read again if
+    the log is unchanged; otherwise 410.
+    """
+    target = _api_target()
+    if isinstance(target, Response):
+        return target
+    host, ym, log_path = target
+    rid = request.args.get("rid", "")
+    res = _cached_result(rid)
+    if res is None:
+        if _result_id(log_path) != rid:
+            return _api_error(410, "the log changed since the page was loaded")
+        sel = _select_lines(log_path, _n_arg(), _full_query(request.args.get("q", "").strip()))
+        if sel is None:
+            return _api_error(404, "file not found")
+        res = _store_result(rid, _row_items(sel[0], request.args.get("view", "pretty")))
+    raws, sufs = res
+    start = min(_offset_arg("start") or 0, len(raws))
+    count = _offset_arg("count") or RENDER_WINDOW
+    stop = min(len(raws), start + min(count, 4 * RENDER_WINDOW))
+    view = request.args.get("view", "pretty")
+    prefix = request.headers.get("X-Forwarded-Prefix", "/")
+    if not prefix.endswith("/"):
+        prefix += "/"
+    items = list(zip(as_records(raws[start:stop]), sufs[start:stop]))
+    rows = render_items(items, view, compile_query(request.args.get("q", "").strip()).highlight,
+                        _view_link_base(prefix, host, ym))
+    return jsonify({"start": start, "count": len(rows), "total": len(raws),
+                    "html": ("\n" if view in ("raw", "pretty") else "").join(rows)})
+
+@app.get("/search")
+@requires_auth
+def search():
+    """Filter the whole month in parallel and stream matches in file order."""
+    hosts = list_hosts()
+    if not hosts:
+        return Response("No logs", 404)
+    host = request.args.get("host", hosts[-1])
+    months = list_months(host)
+    if not months:
+        return Response("No months", 404)
+    ym = request.args.get("ym", months[-1])
+    q = request.args.get("q", "").strip()
+    log_path = pick_log_path(host, ym)
+    if not log_path.exists():
+        return Response("File not found", 404)
+
+    def generate():
+        for batch in search_file(log_path, q):
+            if batch:
+                yield "\n".join(batch) + "\n"
+    return Response(stream_with_context(generate()), mimetype="text/plain")
+
+def _api_error(status, msg):
+    resp = jsonify({"error": msg})
+    resp.status_code = status
+    return resp
+
+def _api_target():
+    """(host, ym, log_path) from the query args, or a JSON error response."""
+    hosts = list_hosts()
+    if not hosts:
+        return _api_error(404, "no logs")
+    host = request.args.get("host", hosts[-1])
+    months = list_months(host)
+    if not months:
+        return _api_error(404, "no months")
+    ym = request.args.get("ym", months[-1])
+    return host, ym, pick_log_path(host, ym)
+
+@app.get("/api/lines")
+@requires_auth
+def api_lines():
+    """One page of filtered records (parse_kv fields) plus opaque older/newer cursors.
+
+    Without a cursor a live log returns its newest matching lines and an
+    archive (.gz/.arc) its oldest. Pass the returned cursor back as cursor= to
+    fetch the next page; "newer" on a live log can be polled for new lines.
+    """
+    target = _api_target()
+    if isinstance(target, Response):
+        return target
+    host, ym, log_path = target
+    try:
+        st = os.stat(log_path)
+    except FileNotFoundError:
+        return _api_error(404, "file not found")
     try:
-        n = max(1, min(50000, int(request.args.get("n", "2000"))))
+        limit = max(1, min(5000, int(request.args.get("limit", "500"))))
     except ValueError:
-        n = 2000
-    q = request.args.get("q", "").strip()
-    regex = None
-    if q:
+        limit = 500
+    q_full = _full_query(request.args.get("q", "").strip())
+    gz = is_archive(log_path)
+    size = archive_size(log_path) if gz else st.st_size
+    token = request.args.get("cursor", "")
+    if token:
+        cur = decode_cursor(token)
+        if cur is None or (gz and cur[0] == OLDER):
+            return _api_error(400, "invalid cursor")
+        direction, ino, off = cur
+        if ino != st.st_ino or off > size:
+            return _api_error(410, "cursor expired: the log was rotated or truncated")
+    elif gz:
+        direction, off = NEWER, 0
+    else:
+        direction, off = OLDER, complete_end(log_path)
+
+    older = newer = None
+    if direction == NEWER:
+        res = read_matching_after(log_path, off, limit, q_full)
+        if res is None:
+            return _api_error(404, "file not found")
+        lines, nxt = res
+        newer = nxt if not (gz and nxt >= size) else None
+        older = off if off and not gz else None
+    else:
+        res = tail_matching(log_path, limit, q_full, off)
+        if res is None:
+            return _api_error(404, "file not found")
+        lines, older, _ = res
+        newer = off
+    return jsonify({
+        "host": host, "ym": ym, "count": len(lines),
+        "records": [record_json(ln) for ln in lines],
+        "older": encode_cursor(OLDER, st.st_ino, older) if older else None,
+        "newer": encode_cursor(NEWER, st.st_ino, newer) if newer is not None else None,
+    })
+
+def _api_panels(names):
+    """(host, ym, analyzer results, lines read, lines matched) for the page's slice / filter args.
+
+    scope=month analyzes every matching line of the month in the search pool
+    instead (sketch-backed, so memory stays fixed); lines read is then None.
+    """
+    target = _api_target()
+    if isinstance(target, Response):
+        return target
+    host, ym, log_path = target
+    q_full = _full_query(request.args.get("q", "").strip())
+    if request.args.get("scope") == "month":
         try:
-            terms = [t for t in re.split(r'[| ]+', q) if t]
-            rx_terms = [t for t in terms if '=' not in t]
-            if rx_terms:
-                regex = re.compile("|".join(rx_terms), re.I)
-        except re.error:
-            regex = None
+            eng = analyze_file(log_path, q_full, names)
+        except FileNotFoundError:
+            return _api_error(404, "file not found")
+        return host, ym, eng.results(), None, eng.lines
+    res = _select_lines(log_path, _n_arg(), q_full)
+    if res is None:
+        return _api_error(404, "file not found")
+    lines, total, _, _ = res
+    return host, ym, analyze(lines, names), total, len(lines)
+
+@app.get("/api/summary")
+@requires_auth
+def api_summary():
+    """Top talkers / dst ports of the selected slice (same args as the page, or scope=month)."""
+    sel = _api_panels(("summary",))
+    if isinstance(sel, Response):
+        return sel
+    host, ym, res, total, matched = sel
+    ips, ports = res["summary"]
+    return jsonify({
+        "host": host, "ym": ym, "lines": total, "matched": matched,
+        "top_ips": [{"ip": ip, "count": c} for ip, c in ips],
+        "top_ports": [{"dport": int(p), "count": c} for p, c in ports],
+    })
+
+@app.get("/api/suspicious")
+@requires_auth
+def api_suspicious():
+    """BitTorrent, scan and risky-port indicators of the selected slice (or scope=month)."""
+    sel = _api_panels(("suspicious", "bittorrent", "scan_window"))
+    if isinstance(sel, Response):
+        return sel
+    host, ym, res, total, matched = sel
+    out = suspicious_json(res["suspicious"], res["bittorrent"])
+    out["scan_windows"] = res["scan_window"]
+    return jsonify({"host": host, "ym": ym, "lines": total, "matched": matched, **out})
 
+def _chart_svg(series, step):
+    """Bar chart of [(minute, total, deny, bt), ...]: total, with deny and BT hits overlaid."""
+    if not series:
+        return ""
+    w, h = 900, 160
+    bw = w / len(series)
+    peak = max(t for _, t, _, _ in series) or 1
+    bars = []
+    for i, (mi, t, d, b) in enumerate(series):
+        x = i * bw
+        label = f"day {mi // 1440 + 1} {mi % 1440 // 60:02d}:{mi % 60:02d} (+{step}m): {t} lines, {d} deny, {b} BT"
+        bars.append(f'<g><title>{label}</title>'
+                    f'<rect class="t" x="{x:.1f}" y="{h - t * h / peak:.1f}" width="{max(bw - 1, 1):.1f}" height="{t * h / peak:.1f}"/>'
+                    f'<rect class="d" x="{x:.1f}" y="{h - d * h / peak:.1f}" width="{max(bw - 1, 1):.1f}" height="{d * h / peak:.1f}"/>'
+                    f'<rect class="b" x="{x:.1f}" y="{h - b * h / peak:.1f}" width="{max(bw - 1, 1):.1f}" height="{b * h / peak:.1f}"/></g>')
+    return f'<svg class="chart" viewBox="0 0 {w} {h}" preserveAspectRatio="none">{"".join(bars)}</svg>'
+
+@app.get("/dashboard")
+@requires_auth
+def dashboard():
+    """Month (or day) summaries and a traffic chart from the per-minute rollups."""
+    hosts = list_hosts()
+    if not hosts:
+        return render_template_string(LAYOUT, content="<p>No logs yet.</p>")
+    host = request.args.get("host", hosts[-1])
+    months = list_months(host)
+    if not months:
+        return render_template_string(LAYOUT, content="<p>No month folders.</p>")
+    ym = request.args.get("ym", months[-1])
+    day = request.args.get("day", "").strip()
+    prefix = request.headers.get("X-Forwarded-Prefix", "/")
+    if not prefix.endswith("/"):
+        prefix += "/"
     log_path = pick_log_path(host, ym)
-    lines = tail_file(log_path, n) or []
-    lines = apply_filters(lines, regex, q)
+    roll = update_rollup(log_path, ROLLUP_CATCHUP)
+    if roll is None:
+        return _file_not_found(log_path)
+    lo, hi = minute_range(ym, day)
+    if hi - lo < MONTH_MINUTES:
+        step = 10
+    else:
+        step = 60
+        day = ""
+    t0 = time.perf_counter()
+    summ = roll.summary(lo, hi)
+    chart = _chart_svg(roll.series(lo, hi, step), step)
+    took = (time.perf_counter() - t0) * 1000
+
+    def nav(label, **kw):
+        return f'<a class="chip" href="{prefix}dashboard?{html.escape(urlencode({"host": host, "ym": ym, **kw}))}">{label}</a>'
+    days = sorted({mi // 1440 + 1 for mi, t, _, _ in roll.series(0, MONTH_MINUTES, 1440) if t})
+    day_links = nav("month") + "".join(nav(str(d), day=f"{ym}-{d:02d}") for d in days)
+    opts_host = "".join(f'<option value="{html.escape(h)}" {"selected" if h == host else ""}>{html.escape(h)}</option>' for h in hosts)
+    opts_month = "".join(f'<option value="{html.escape(m)}" {"selected" if m == ym else ""}>{html.escape(m)}</option>' for m in months)
+
+    def table(title, rows, kind, q_fmt):
+        items = "".join(
+            f'<tr><td>{html.escape(str(k))}</td><td>{v}</td>'
+            f'<td><a href="{prefix}?{html.escape(urlencode({"host": host, "ym": ym, "mode": "match", "q": q_fmt.format(k)}))}">lines</a></td></tr>'
+            for k, v in rows)
+        return f"<h3>{title}</h3><table class='mini'><tr><th>{kind}</th><th>count</th><th></th></tr>{items}</table>"
 
-    buf = io.BytesIO("\n".join(lines).encode("utf-8", "ignore"))
-    return send_file(buf, as_attachment=True, download_name="watchguard.txt", mimetype="text/plain")
+    size = os.path.getsize(log_path) if not is_archive(log_path) else roll.end
+    coverage = "" if roll.end >= size else (
+        f' <span class="muted">(indexed {roll.end * 100 // max(size, 1)}% of the log so far; run tools/rollup.py)</span>')
+    scope = html.escape(day) if day else html.escape(ym)
+    body = f"""
+    <form class="bar" method="get" action="{prefix}dashboard">
+      <label>Host <select name="host">{opts_host}</select></label>
+      <label>Month <select name="ym">{opts_month}</select></label>
+      <button type="submit">Show</button>
+      <a class="chip" href="{prefix}?{html.escape(urlencode({"host": host, "ym": ym}))}">Live view</a>
+    </form>
+    <div class="bar">{day_links}</div>
+    <div class="bar"><span>{scope}: {summ["lines"]} lines, {summ["allow"]} allow, {summ["deny"]} deny, {summ["bt"]} BT hits</span>{coverage}</div>
+    {chart}
+    <div class="bar muted">{step}-minute buckets: blue = lines, red = deny, amber = BitTorrent; rendered in {took:.0f} ms</div>
+    <div class="bar">
+      <div>{table("Top internal IPs", summ["top_ips"], "ip", "ip={}")}</div>
+      <div>{table("Top dst ports", summ["top_ports"], "dport", "dport={}")}</div>
+      <div>{table("Risky ports allowed", summ["risky_ports"], "dport", "dport={} action=Allow")}</div>
+    </div>
+    """
+    return render_template_string(LAYOUT, content=body)
+
+@app.get("/api/rollup")
+@requires_auth
+def api_rollup():
+    """Rollup summary and per-bucket series (step= minutes) for a month or day=YYYY-MM-DD.
+
+    index=0 answers from the sidecar as written so far (e.g. by tools/rollup.py)
+    without indexing anything new.
+    """
+    target = _api_target()
+    if isinstance(target, Response):
+        return target
+    host, ym, log_path = target
+    if request.args.get("index") == "0":
+        roll = load_rollup(log_path)
+        if roll is None:
+            return _api_error(404, "no rollup yet")
+    else:
+        roll = update_rollup(log_path, ROLLUP_CATCHUP)
+        if roll is None:
+            return _api_error(404, "file not found")
+    lo, hi = minute_range(ym, request.args.get("day", "").strip())
+    try:
+        step = max(1, int(request.args.get("step", "60")))
+    except ValueError:
+        step = 60
+    summ = roll.summary(lo, hi)
+    return jsonify({
+        "host": host, "ym": ym, "indexed_bytes": roll.end, **summ,
+        "top_ips": [{"ip": ip, "count": c} for ip, c in summ["top_ips"]],
+        "top_ports": [{"dport": p, "count": c} for p, c in summ["top_ports"]],
+        "risky_ports": [{"dport": p, "count": c} for p, c in summ["risky_ports"]],
+        "series": [{"minute": m, "lines": t, "deny": d, "bt": b} for m, t, d, b in roll.series(lo, hi, step)],
+    })
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8811)
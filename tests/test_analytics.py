@@ -0,0 +1,21 @@
+from watchlog_lite.services import analytics
+from watchlog_lite.services.analytics import Engine, Suspicious
+from watchlog_lite.services.logs import LogRecord
+
+def _line(ip, dport):
+    return f"date=2025-01-01 time=00:00:00 action=Deny src={ip} dst=8.8.8.8 dport={dport}"
+
+def test_new_scanner_counted_after_scan_map_fills(monkeypatch):
+    monkeypatch.setattr(analytics, "SKETCH_CAPACITY", 4)
+    # 18 sources: prunes at 9 and 14 leave the map full (2 * capacity) when the scanner arrives
+    quiet = [_line(f"192.168.1.{i}", 80) for i in range(1, 19)]
+    scanner = [_line("192.168.2.1", p) for p in range(1000, 1015)]
+    for feed in ("record", "columns"):
+        if feed == "record":
+            sus = Suspicious()
+            for ln in quiet + scanner:
+                sus.feed(LogRecord(ln), False)
+            res = sus.result()
+        else:
+            res = Engine(("suspicious",)).feed(quiet + scanner).results()["suspicious"]
+        assert ("192.168.2.1", 15) in res["scan_suspects"], feed
@@ -0,0 +1,22 @@
+from watchlog_lite.services import logs
+from watchlog_lite.services.logs import tail_file, tail_file_cached
+
+def _lines(a, b):
+    return "".join(f"date=2025-01-01 time=00:00:00 action=Allow src=192.168.1.{i % 250} dport={i}\n"
+                   for i in range(a, b))
+
+def test_tail_cache_large_growth_rebuilds(tmp_path, monkeypatch):
+    p = tmp_path / "watchguard.log"
+    p.write_text(_lines(0, 100))
+    assert tail_file_cached(p, 10) == tail_file(p, 10)
+    with p.open("a") as f:
+        f.write(_lines(100, 105))  # small growth: appended bytes read by _tail_extend
+    assert tail_file_cached(p, 10) == tail_file(p, 10)
+
+    def no_extend(*a):
+        raise AssertionError("large growth must be re-read from the end")
+    monkeypatch.setattr(logs, "_tail_extend", no_extend)
+    with p.open("a") as f:
+        f.write(_lines(105, 5000) + "date=2025-01-01 partial")
+    out = tail_file_cached(p, 10)
+    assert out == tail_file(p, 10) and out[-1] == "date=2025-01-01 partial"
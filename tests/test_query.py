@@ -0,0 +1,21 @@
+from watchlog_lite.services.logs import parse_kv
+from watchlog_lite.services.query import compile_query
+
+LINES = [
+    "date=2025-01-01 time=00:00:01 action=Allow msg=X src=192.168.1.2 dst=8.8.8.8 dport=53",
+    "date=2025-01-01 time=00:00:02 action=Deny log=X src=192.168.1.3 dst=1.1.1.1 dport=6881",
+    "date=2025-01-01 time=00:00:03 msg=Allow src=192.168.1.4 dst=9.9.9.9 dport=443",
+]
+
+def test_msg_and_log_compare_raw_keys():
+    assert compile_query("msg=X").filter(LINES) == LINES[:1]
+    assert compile_query("log=X").filter(LINES) == LINES[1:2]
+    assert compile_query("msg!=X").filter(LINES) == LINES[1:]
+
+def test_action_matches_merged_field():
+    assert compile_query("action=Allow").filter(LINES) == [LINES[0], LINES[2]]
+
+def test_kv_matches_parse_kv():
+    for q in ("msg=X", "log=X", "action=Deny", "dport=53", "src=192.168.1.3"):
+        k, v = q.split("=", 1)
+        assert compile_query(q).filter(LINES) == [l for l in LINES if parse_kv(l).get(k) == v]
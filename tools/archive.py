@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Convert closed months into block archives (watchguard.log.arc).
+
+Usage: tools/archive.py [--block-size BYTES] [--remove] FILE...
+
+Each FILE (a watchguard.log or watchguard.log.gz) is rewritten next to
+itself as watchguard.log.arc: zlib-compressed blocks of about BLOCK_SIZE
+bytes with per-block time ranges and bloom filters of src/dst IP and
+dport. The UI reads an .arc whenever the plain log is gone and prefers it
+over a .gz, so ip=/dport=/since= queries skip most of the month.
+--remove deletes FILE once the archive's size has been checked against it.
+Only convert months that are no longer written to.
+"""
+import argparse, os, sys, zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from watchlog_lite.services.logs import ARC_SUFFIX
+from watchlog_lite.services.archive import BLOCK_SIZE, archive_size, write_archive
+
+def target(path: Path) -> Path:
+    name = path.name[:-3] if path.name.endswith(".gz") else path.name
+    return path.with_name(name + ARC_SUFFIX)
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert closed-month logs into block archives")
+    ap.add_argument("files", nargs="+", type=Path)
+    ap.add_argument("--block-size", type=int, default=BLOCK_SIZE, help="uncompressed bytes per block")
+    ap.add_argument("--remove", action="store_true", help="delete each source after converting it")
+    args = ap.parse_args()
+    rc = 0
+    for path in args.files:
+        dst = target(path)
+        try:
+            src_size = archive_size(path) if path.name.endswith(".gz") else os.path.getsize(path)
+            arc = write_archive(path, dst, args.block_size)
+        except (OSError, zlib.error) as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            rc = 1
+            continue
+        if arc.usize != src_size:
+            print(f"{path}: archive holds {arc.usize} of {src_size} bytes, source kept", file=sys.stderr)
+            rc = 1
+            continue
+        print(f"{path} -> {dst}: {len(arc)} blocks, {arc.usize} -> {arc.size} bytes")
+        if args.remove:
+            path.unlink()
+    return rc
+
+if __name__ == "__main__":
+    raise SystemExit(main())
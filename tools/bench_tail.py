@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Compare the legacy block-prepend tail with the mmap tail engine.
+
+Usage: tools/bench_tail.py [LOGFILE]   (a synthetic log is generated if omitted)
+"""
+import os, sys, time, tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from watchlog_lite.services.tail import tail_lines
+
+SIZES = (2000, 50000, 500000)
+
+def legacy_tail(path: Path, n: int):
+    # The pre-engine implementation: prepend 8 KiB blocks and re-split every time.
+    with path.open("rb") as f:
+        f.seek(0, 2); size = f.tell(); buf = b""; pos = size; lines = []
+        while pos > 0 and len(lines) <= n:
+            rd = min(8192, pos); pos -= rd; f.seek(pos)
+            buf = f.read(rd) + buf; lines = buf.splitlines()
+    return [l.decode("utf-8", "ignore") for l in lines[-n:]]
+
+def make_log(path: Path, count: int):
+    with path.open("w") as f:
+        for i in range(count):
+            f.write(f"date=2025-01-01 time=00:{i // 60 % 60:02d}:{i % 60:02d} action=Allow "
+                    f"src_ip=192.168.1.{i % 250} dst_ip=8.8.{i % 7}.{i % 200} sport={1024 + i % 60000} dport=443 proto=tcp\n")
+
+def timed(fn, *a):
+    t0 = time.perf_counter()
+    out = fn(*a)
+    return time.perf_counter() - t0, out
+
+def main():
+    if len(sys.argv) > 1:
+        path = Path(sys.argv[1])
+    else:
+        path = Path(tempfile.mkstemp(suffix=".log")[1])
+        make_log(path, max(SIZES) + 1000)
+    try:
+        print(f"{'n':>8} {'legacy s':>10} {'mmap s':>10} {'speedup':>8}")
+        for n in SIZES:
+            t_old, a = timed(legacy_tail, path, n)
+            t_new, b = timed(tail_lines, path, n)
+            assert a == b, "engines disagree"
+            print(f"{n:>8} {t_old:>10.4f} {t_new:>10.4f} {t_old / max(t_new, 1e-9):>7.1f}x")
+    finally:
+        if len(sys.argv) <= 1:
+            os.unlink(path)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,45 +1,48 @@
 #!/usr/bin/env python3
-import os, re, sys, glob, json, urllib.request
+import os, sys, json, time, signal, argparse, urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from itertools import compress
 from pathlib import Path
 
-BASE = Path("/var/log/watchguard")
-FIREWALL = os.getenv("WG_HOST", "GRC-GAIN-FW01-2")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from watchlog_lite.services.tail import tail_lines
+from watchlog_lite.services.logs import BASE, list_hosts, list_months
+from watchlog_lite.services.detect import analyze_suspicious
+from watchlog_lite.services.columns import bt_flags
+from watchlog_lite.services.analytics import Engine, SCAN_WINDOW
 
-def newest_log():
-    months = sorted(glob.glob(str(BASE / FIREWALL / "20*")), reverse=True)
+# Hosts are every folder under WG_LOG_BASE unless WG_HOST (comma-separated) narrows it;
+# one-shot scans run on up to WG_DETECTOR_WORKERS processes.
+WORKERS = int(os.getenv("WG_DETECTOR_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+# Daemon mode (--daemon): where read offsets are checkpointed, how often the
+# log is polled and how long matches are collected into one alert.
+STATE_FILE = Path(os.getenv("WG_DETECTOR_STATE", "/var/lib/watchlog-detector/state.json"))
+POLL_SECONDS = float(os.getenv("WG_DETECTOR_POLL", "2"))
+ALERT_WINDOW = float(os.getenv("WG_ALERT_WINDOW", "60"))
+READ_MAX = 8 << 20
+
+def detector_hosts():
+    only = [h.strip() for h in os.getenv("WG_HOST", "").split(",") if h.strip()]
+    return only or list_hosts()
+
+def newest_log(host: str):
+    months = [m for m in list_months(host) if m.startswith("20")]
     if not months:
         return None
-    log = Path(months[0]) / "watchguard.log"
+    log = BASE / host / months[-1] / "watchguard.log"
     return log if log.exists() else None
 
-# Ports: 38315, 51413, 6881-6999 (bittorrent)
-PAT = re.compile(r'(bittorrent|dht|announce|magnet:|d(?:st_)?port=(?:38315|51413|68[8-9]\d|69\d\d))', re.I)
-IP  = re.compile(r'(?:src(?:_ip)?=|saddr=)(\d+\.\d+\.\d+\.\d+)')
-
 def tail(path: Path, n=10000):
-    lines = []
-    with path.open("rb") as f:
-        f.seek(0,2); size=f.tell(); block=8192; buf=b""; pos=size
-        while pos>0 and len(lines)<=n:
-            rd=min(block,pos); pos-=rd; f.seek(pos)
-            buf=f.read(rd)+buf; lines=buf.splitlines()
-    return [l.decode("utf-8","ignore") for l in lines[-n:]]
+    return tail_lines(path, n)
 
-def main():
-    log = newest_log()
-    if not log:
-        return 0
-    hits = [ln for ln in tail(log) if PAT.search(ln)]
-    if not hits:
-        return 0
-    ips=set()
-    for ln in hits:
-        m=IP.search(ln)
-        if m and m.group(1).startswith("192.168."):
-            ips.add(m.group(1))
-    msg = f"[watchlog-detector] BT signatures in {log}:\n" + ("\n".join(sorted(ips)) if ips else "(no internal src_ip parsed)")
-    print(msg)
+def bt_hits(lines):
+    """BT indicators among lines: analyze_suspicious() over the PAT_BT hits only, or None."""
+    hits = list(compress(lines, bt_flags(lines)))
+    return analyze_suspicious(hits) if hits else None
 
+def notify(msg: str):
+    print(msg, flush=True)
     webhook=os.getenv("SLACK_WEBHOOK","" ).strip()
     if webhook:
         data=json.dumps({"text":msg}).encode()
@@ -48,8 +51,214 @@ def main():
             urllib.request.urlopen(req, timeout=5)
         except Exception as e:
             print(f"slack notify error: {e}", file=sys.stderr)
+
+def scan_host(host: str):
+    """(host, log, lines scanned, bt_hits() result, seconds) for the newest log of host."""
+    t0 = time.perf_counter()
+    log = newest_log(host)
+    if not log:
+        return host, None, 0, None, time.perf_counter() - t0
+    lines = tail(log)
+    return host, log, len(lines), bt_hits(lines), time.perf_counter() - t0
+
+def main():
+    hosts = detector_hosts()
+    if not hosts:
+        return 0
+    with ProcessPoolExecutor(max_workers=max(1, min(WORKERS, len(hosts)))) as pool:
+        results = list(pool.map(scan_host, hosts))
+    for host, log, _, sus, _ in results:
+        if sus:
+            ips = "\n".join(sus["bt_ips"]) or "(no internal src_ip parsed)"
+            notify(f"[watchlog-detector] BT signatures in {log}:\n{ips}")
+    # per-host timings, slowest first
+    for host, _, n, sus, secs in sorted(results, key=lambda r: r[4], reverse=True):
+        print(f"{host:<24} {n:>7} lines {sus['bt_count'] if sus else 0:>6} hits {secs:8.3f}s", file=sys.stderr)
     return 0
 
-if __name__ == "__main__":
-    raise SystemExit(main())
+# ---------- Daemon mode ----------
+
+class Follower:
+    """Follows the newest watchguard.log of one host through rotation and month rollover.
+
+    The file stays open, so lines appended to a log that was just rotated
+    away are still read before switching to its successor.
+    """
+    __slots__ = ("host", "path", "f", "ino", "offset")
+
+    def __init__(self, host: str):
+        self.host = host
+        self.path = None
+        self.f = None
+        self.ino = 0
+        self.offset = 0
+
+    def open(self, path: Path, offset: int = 0):
+        self.close()
+        self.f = open(path, "rb")
+        self.path, self.ino, self.offset = path, os.fstat(self.f.fileno()).st_ino, offset
+
+    def close(self):
+        if self.f:
+            self.f.close()
+        self.f = None
 
+    def resume(self, saved: dict):
+        """Continue at a checkpoint if its file is still there, else at the end of the newest log."""
+        path = Path(saved["path"]) if saved.get("path") else None
+        try:
+            if path and os.stat(path).st_ino == saved.get("ino"):
+                self.open(path, saved.get("offset", 0))
+                return
+        except FileNotFoundError:
+            pass
+        newest = newest_log(self.host)
+        if newest is not None:
+            # the checkpointed file was rotated away while we were down: its
+            # successor is entirely unseen; on first start skip the backlog
+            self.open(newest, 0 if path else os.path.getsize(newest))
+
+    def switch_pending(self) -> bool:
+        """True once the open log is drained and a newer one (rotation/next month) exists."""
+        newest = newest_log(self.host)
+        if newest is None:
+            return False
+        if self.f is None or newest != self.path:
+            return True
+        try:
+            return os.stat(newest).st_ino != self.ino
+        except FileNotFoundError:
+            return False
+
+    def read(self):
+        """Complete lines appended since the last read."""
+        if self.f is None:
+            return []
+        if os.fstat(self.f.fileno()).st_size < self.offset:
+            self.offset = 0  # truncated in place
+        self.f.seek(self.offset)
+        data = self.f.read(READ_MAX)
+        cut = data.rfind(b"\n") + 1
+        if not cut:
+            return []
+        self.offset += cut
+        return [l.decode("utf-8", "ignore").rstrip("\r") for l in data[:cut - 1].split(b"\n")]
+
+    def behind(self) -> bool:
+        """True if more than one read's worth is still waiting (catching up after a restart)."""
+        return self.f is not None and os.fstat(self.f.fileno()).st_size - self.offset > READ_MAX
+
+    def checkpoint(self) -> dict:
+        return {"path": str(self.path) if self.path else None, "ino": self.ino, "offset": self.offset}
+
+class Batch:
+    """Matches collected for one alert, fed incrementally; flushed once the window has passed."""
+    __slots__ = ("started", "engine", "scans")
+
+    def __init__(self):
+        self.started = None
+        self.engine = Engine(("suspicious",))
+        self.scans = []   # (ip, distinct dports, ts) from the host's ScanWindow
+
+    def add(self, lines, scans=()):
+        hits = list(compress(lines, bt_flags(lines)))
+        if hits or scans:
+            if self.started is None:
+                self.started = time.monotonic()
+            self.engine.feed(hits)
+            self.scans.extend(scans)
+
+    @property
+    def hits(self) -> int:
+        return self.engine.analyzers["suspicious"].bt_count + len(self.scans)
+
+    def due(self, window: float) -> bool:
+        return self.started is not None and time.monotonic() - self.started >= window
+
+def load_state(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+def save_state(path: Path, state: dict):
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"state save error: {e}", file=sys.stderr)
+
+def flush(f: Follower, batch: Batch):
+    sus = batch.engine.results()["suspicious"]
+    if sus["bt_count"]:
+        ips = "\n".join(sus["bt_ips"]) or "(no internal src_ip parsed)"
+        notify(f"[watchlog-detector] {sus['bt_count']} BT signatures on {f.host} in {f.path}:\n{ips}")
+    if batch.scans:
+        rows = "\n".join(f"{ip}: {n} dports within {SCAN_WINDOW}s at {ts}" for ip, n, ts in batch.scans)
+        notify(f"[watchlog-detector] port scans on {f.host} in {f.path}:\n{rows}")
+    return Batch()
+
+def daemon(hosts=None, state_file: Path = STATE_FILE, poll: float = POLL_SECONDS,
+           window: float = ALERT_WINDOW):
+    """Follow each host's newest log and alert on BT signatures and port-scan bursts, batched per window.
+
+    With hosts=None the host list is re-read every poll, so new firewalls
+    are picked up without a restart. The checkpoint for a host only
+    advances when it has no unsent matches, so after a restart reading
+    resumes exactly where the last alert (or the last hit-free poll) left
+    off: nothing is skipped or alerted twice. Scan windows live in memory
+    only, so a burst cut by a restart is judged on the lines after it.
+    """
+    state = load_state(state_file)
+    followers, batches, scans, spent = {}, {}, {}, {}
+    stop = []
+    signal.signal(signal.SIGTERM, lambda *_: stop.append(1))
+    try:
+        while not stop:
+            for host in (hosts if hosts is not None else detector_hosts()):
+                if host not in followers:
+                    followers[host] = Follower(host)
+                    followers[host].resume(state.get(host, {}))
+                    batches[host], spent[host] = Batch(), 0.0
+                    scans[host] = Engine(("scan_window",))
+            dirty = False
+            for host, f in followers.items():
+                t0 = time.perf_counter()
+                lines = f.read()
+                sw = scans[host].feed(lines).analyzers["scan_window"]
+                batches[host].add(lines, sw.drain())
+                if not lines and f.switch_pending():
+                    # old log drained: alert on what it had before moving on
+                    batches[host] = flush(f, batches[host])
+                    newest = newest_log(host)
+                    if newest is not None:
+                        f.open(newest, 0)
+                elif batches[host].due(window):
+                    batches[host] = flush(f, batches[host])
+                if not batches[host].hits and state.get(host) != f.checkpoint():
+                    state[host] = f.checkpoint()
+                    dirty = True
+                spent[host] += time.perf_counter() - t0
+            if dirty:
+                save_state(state_file, state)
+            if not any(f.behind() for f in followers.values()):
+                time.sleep(poll)
+    except KeyboardInterrupt:
+        pass
+    for host, f in followers.items():
+        batches[host] = flush(f, batches[host])
+        state[host] = f.checkpoint()
+        f.close()
+    save_state(state_file, state)
+    for host, secs in sorted(spent.items(), key=lambda kv: kv[1], reverse=True):
+        print(f"{host:<24} {secs:8.3f}s", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Find BitTorrent signatures in WatchGuard logs.")
+    ap.add_argument("--daemon", action="store_true",
+                    help="follow the logs continuously instead of scanning the last 10,000 lines once")
+    args = ap.parse_args()
+    raise SystemExit(daemon() if args.daemon else main())
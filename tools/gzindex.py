@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Build seek-point indexes (.gzi) for rotated watchguard.log.gz archives.
+
+Usage: tools/gzindex.py [--rewrite] [--member-size BYTES] FILE.gz...
+
+--rewrite recompresses each archive into line-aligned gzip members of about
+--member-size uncompressed bytes (default 4 MiB). The result is still a
+normal .gz (zcat/gzip read it unchanged) but every member start is a
+persisted seek point, so tail/page/search reads decompress only nearby data.
+"""
+import argparse, gzip, os, sys, zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from watchlog_lite.services.gzindex import get_gz_index, iter_gz
+
+def rewrite(path: Path, member_size: int) -> None:
+    st = os.stat(path)
+    tmp = path.with_name(path.name + ".rewrite.tmp")
+    with tmp.open("wb") as out:
+        buf = b""
+        for chunk in iter_gz(path):
+            buf += chunk
+            while len(buf) >= member_size:
+                cut = buf.rfind(b"\n", 0, member_size) + 1 or buf.find(b"\n", member_size) + 1
+                if not cut:
+                    break  # one enormous line: wait for its end
+                out.write(gzip.compress(buf[:cut], 6, mtime=0))
+                buf = buf[cut:]
+        if buf:
+            out.write(gzip.compress(buf, 6, mtime=0))
+    os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(tmp, path)
+
+def main():
+    ap = argparse.ArgumentParser(description="Index (and optionally re-chunk) .gz logs for random access")
+    ap.add_argument("files", nargs="+", type=Path)
+    ap.add_argument("--rewrite", action="store_true", help="recompress into line-aligned members")
+    ap.add_argument("--member-size", type=int, default=4 << 20)
+    args = ap.parse_args()
+    rc = 0
+    for path in args.files:
+        try:
+            if args.rewrite:
+                rewrite(path, args.member_size)
+            idx = get_gz_index(path)
+        except (OSError, zlib.error) as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            rc = 1
+            continue
+        print(f"{path}: {len(idx.m_comp)} members, {idx.usize} bytes uncompressed")
+    return rc
+
+if __name__ == "__main__":
+    raise SystemExit(main())
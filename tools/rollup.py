@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Background indexer for the per-minute rollups behind /dashboard.
+
+Usage: tools/rollup.py [--loop SECONDS]
+
+Indexes every month of every host under WG_LOG_BASE once. With --loop it
+then keeps the newest month of each host up to date every SECONDS
+(finished months and .gz/.arc archives do not change).
+"""
+import argparse, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from watchlog_lite.services.logs import list_hosts, list_months, pick_log_path
+from watchlog_lite.services.rollup import update_rollup, forget_rollup
+
+_seen = {}
+
+def index(host: str, ym: str, keep: bool) -> None:
+    path = pick_log_path(host, ym)
+    t0 = time.perf_counter()
+    roll = update_rollup(path)
+    if roll is not None and _seen.get(path) != roll.end:
+        _seen[path] = roll.end
+        print(f"{host} {ym}: {roll.end} bytes indexed, {roll.segments} segments, "
+              f"{time.perf_counter() - t0:.2f}s", file=sys.stderr)
+    if not keep:
+        forget_rollup(path)
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--loop", type=float, metavar="SECONDS",
+                    help="keep the newest month of each host indexed")
+    args = ap.parse_args()
+    for host in list_hosts():
+        months = list_months(host)
+        for ym in months:
+            index(host, ym, keep=ym == months[-1])
+    while args.loop:
+        time.sleep(args.loop)
+        for host in list_hosts():
+            months = list_months(host)
+            if months:
+                index(host, months[-1], keep=True)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
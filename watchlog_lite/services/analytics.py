@@ -0,0 +1,356 @@
+import calendar, collections, os
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Sequence
+from .logs import as_record
+from .detect import RE_IP_INLINE, RISKY_PORTS, _is_private_ip
+from .sketch import SpaceSaving, DistinctCounter, SKETCH_CAPACITY
+from .columns import (Columns, ACT_ALLOW, ip4_str, private_mask, prefix_mask, port_mask,
+                      both, equals, count_values, distinct_pairs)
+
+# Fused analytics: every registered analyzer sees each record once, in a
+# single pass, with the per-line work they share (field parsing, the PAT_BT
+# search) done once. Analyzers are incremental: feed() the lines appended
+# since the last call and result() reflects everything seen so far. The
+# built-in ones keep fixed-size sketches (see sketch.py) and merge(), so
+# chunks scanned by different workers combine into the same panels.
+# Lines are fed in batches of BATCH as column arrays (see columns.py); the
+# built-in panels aggregate a whole batch at once.
+BATCH = 4096
+
+ANALYZERS: Dict[str, type] = {}
+
+def register(name: str):
+    """Class decorator adding an Analyzer under name."""
+    def deco(cls):
+        cls.name = name
+        ANALYZERS[name] = cls
+        return cls
+    return deco
+
+class Analyzer:
+    """One panel/detector: feed(rec, bt) per LogRecord, result() at any time.
+
+    Analyzers with default = False only run when asked for by name.
+    """
+    name = ""
+    default = True
+    __slots__ = ()
+
+    def feed(self, rec, bt: bool) -> None:
+        raise NotImplementedError
+
+    def feed_columns(self, cols: Columns) -> None:
+        """A whole batch at once; by default feed() per record."""
+        feed = self.feed
+        for rec, bt in zip(cols.recs, cols.bt):
+            feed(rec, bt)
+
+    def result(self):
+        raise NotImplementedError
+
+    def merge(self, other: "Analyzer") -> "Analyzer":
+        """Fold in another instance fed with different lines."""
+        raise NotImplementedError
+
+@register("summary")
+class TopTalkers(Analyzer):
+    """Top internal (192.168.x) source IPs and top dst ports, as summarize()."""
+    __slots__ = ("ips", "ports")
+
+    def __init__(self):
+        self.ips, self.ports = SpaceSaving(), SpaceSaving()
+
+    def feed(self, rec, bt):
+        if rec.src_ip and rec.src_ip.startswith("192.168."):
+            self.ips.add(rec.src_ip)
+        if rec.dport is not None:
+            self.ports.add(str(rec.dport))
+
+    def feed_columns(self, cols):
+        for ip, c in count_values(cols.src, prefix_mask(cols.src, 0xC0A80000, 16)):
+            self.ips.add(ip4_str(ip), c)
+        for i in cols.odd:
+            sip = cols.recs[i].src_ip
+            if sip.startswith("192.168."):
+                self.ips.add(sip)
+        for p, c in count_values(cols.dport, port_mask(cols.dport)):
+            self.ports.add(str(p), c)
+
+    def result(self):
+        return self.ips.top(10), self.ports.top(10)
+
+    def merge(self, other):
+        self.ips.merge(other.ips)
+        self.ports.merge(other.ports)
+        return self
+
+def _bt_ip(rec) -> Optional[str]:
+    if rec.src_ip:
+        return rec.src_ip
+    m = RE_IP_INLINE.search(rec.raw)
+    return m.group(1) if m else None
+
+@register("bittorrent")
+class BitTorrentTop(Analyzer):
+    """[(ip, hits), ...] of lines matching the BT heuristics, as summarize_bittorrent()."""
+    __slots__ = ("counts",)
+
+    def __init__(self):
+        self.counts = SpaceSaving()
+
+    def feed(self, rec, bt):
+        if bt:
+            ip = _bt_ip(rec)
+            if ip:
+                self.counts.add(ip)
+
+    def feed_columns(self, cols):
+        recs = cols.recs
+        for i in cols.bt_rows():
+            ip = _bt_ip(recs[i])
+            if ip:
+                self.counts.add(ip)
+
+    def result(self):
+        return self.counts.top(10)
+
+    def merge(self, other):
+        self.counts.merge(other.counts)
+        return self
+
+@register("suspicious")
+class Suspicious(Analyzer):
+    """BT signature count/IPs, port-scan suspects and allowed risky ports, as analyze_suspicious()."""
+    __slots__ = ("bt_count", "bt_ips", "scan_map", "risky")
+
+    def __init__(self):
+        self.bt_count = 0
+        self.bt_ips = set()   # at most SKETCH_CAPACITY
+        self.scan_map = {}  # src_ip -> DistinctCounter of dports, at most 2 * SKETCH_CAPACITY sources
+        self.risky = collections.Counter()  # bounded by RISKY_PORTS
+
+    def feed(self, rec, bt):
+        sip = rec.src_ip
+        if bt:
+            self.bt_count += 1
+            ip = _bt_ip(rec)
+            if ip and _is_private_ip(ip) and len(self.bt_ips) < SKETCH_CAPACITY:
+                self.bt_ips.add(ip)
+        dpt = rec.dport
+        if dpt is not None:
+            if sip and _is_private_ip(sip):
+                self._scan(sip, dpt)
+            if dpt in RISKY_PORTS and (rec.action or "").lower() == "allow":
+                self.risky[dpt] += 1
+
+    def feed_columns(self, cols):
+        recs = cols.recs
+        for i in cols.bt_rows():
+            self.bt_count += 1
+            if len(self.bt_ips) < SKETCH_CAPACITY:
+                ip = _bt_ip(recs[i])
+                if ip and _is_private_ip(ip):
+                    self.bt_ips.add(ip)
+        has_port = port_mask(cols.dport)
+        for sip, dpt in distinct_pairs(cols.src, cols.dport, both(private_mask(cols.src), has_port)):
+            self._scan(ip4_str(sip), dpt)
+        for i in cols.odd:
+            rec = recs[i]
+            if rec.dport is not None and _is_private_ip(rec.src_ip):
+                self._scan(rec.src_ip, rec.dport)
+        allowed = both(port_mask(cols.dport, RISKY_PORTS), equals(cols.action, ACT_ALLOW))
+        for dpt, c in count_values(cols.dport, allowed):
+            self.risky[dpt] += c
+
+    def _scan(self, sip, dpt):
+        ports = self.scan_map.get(sip)
+        if ports is None:
+            if len(self.scan_map) >= 2 * SKETCH_CAPACITY:
+                self._prune()  # before inserting, so the new source survives
+            ports = self.scan_map[sip] = DistinctCounter()
+        ports.add(dpt)
+
+    def _prune(self):
+        # keep the sources with the most distinct ports (in first-seen order)
+        keep = {sip for sip, _ in sorted(((sip, len(p)) for sip, p in self.scan_map.items()),
+                                         key=lambda x: x[1], reverse=True)[:SKETCH_CAPACITY]}
+        self.scan_map = {sip: p for sip, p in self.scan_map.items() if sip in keep}
+
+    def merge(self, other):
+        self.bt_count += other.bt_count
+        self.bt_ips |= other.bt_ips
+        if len(self.bt_ips) > SKETCH_CAPACITY:
+            self.bt_ips = set(sorted(self.bt_ips)[:SKETCH_CAPACITY])
+        for sip, ports in other.scan_map.items():
+            mine = self.scan_map.get(sip)
+            if mine is None:
+                self.scan_map[sip] = ports
+            else:
+                mine.merge(ports)
+        if len(self.scan_map) > 2 * SKETCH_CAPACITY:
+            self._prune()
+        self.risky.update(other.risky)
+        return self
+
+    def result(self) -> Dict:
+        suspects = sorted(((sip, len(p)) for sip, p in self.scan_map.items()), key=lambda x: x[1], reverse=True)
+        return {
+            "bt_count": self.bt_count,
+            "bt_ips": sorted(self.bt_ips),
+            "scan_suspects": [s for s in suspects if s[1] >= 10][:10],
+            "risky_ports": self.risky.most_common(10),
+        }
+
+# Sliding-window scan detection: distinct dports per source within
+# SCAN_WINDOW seconds of log time; a source is reported once that reaches
+# SCAN_WINDOW_PORTS. At most SCAN_WINDOW_EVENTS events are kept per source.
+SCAN_WINDOW = int(os.environ.get("WG_SCAN_WINDOW", "60"))
+SCAN_WINDOW_PORTS = int(os.environ.get("WG_SCAN_WINDOW_PORTS", "10"))
+SCAN_WINDOW_EVENTS = 4096
+
+_MINUTE_EPOCH: Dict[str, int] = {}
+
+def ts_epoch(ts: Optional[str]) -> Optional[int]:
+    """Seconds since the epoch for "YYYY-MM-DD HH:MM:SS" (UTC, as written), or None."""
+    if not ts or len(ts) < 19:
+        return None
+    base = _MINUTE_EPOCH.get(ts[:16])
+    try:
+        if base is None:
+            if len(_MINUTE_EPOCH) > 100000:
+                _MINUTE_EPOCH.clear()
+            base = _MINUTE_EPOCH[ts[:16]] = calendar.timegm(
+                (int(ts[:4]), int(ts[5:7]), int(ts[8:10]), int(ts[11:13]), int(ts[14:16]), 0))
+        return base + int(ts[17:19])
+    except ValueError:
+        return None
+
+class _Window:
+    __slots__ = ("events", "ports", "peak", "peak_at")
+
+    def __init__(self):
+        self.events = collections.deque()    # (epoch, dport), time-ordered
+        self.ports = collections.Counter()   # dport -> events in the window
+        self.peak = 0
+        self.peak_at = None
+
+@register("scan_window")
+class ScanWindow(Analyzer):
+    """Port scans by rate: the most distinct dports a private source hit within SCAN_WINDOW seconds.
+
+    Each source has a time-ordered ring of (ts, dport) plus per-port counts
+    for the current window, so every event costs O(1) amortized. Sources
+    crossing SCAN_WINDOW_PORTS are queued in `alerts` for continuous
+    callers (drain()). merge() expects the later chunk as other and keeps
+    the larger peak per source; windows that straddle two merged chunks
+    are not seen.
+    """
+    __slots__ = ("window", "threshold", "sources", "alerts")
+
+    def __init__(self, window: int = SCAN_WINDOW, threshold: int = SCAN_WINDOW_PORTS):
+        self.window = window
+        self.threshold = threshold
+        self.sources: Dict[str, _Window] = {}
+        self.alerts: List[tuple] = []   # (ip, distinct ports, ts) on first crossing
+
+    def feed(self, rec, bt):
+        dpt = rec.dport
+        sip = rec.src_ip
+        if dpt is None or not sip or not _is_private_ip(sip):
+            return
+        now = ts_epoch(rec.ts)
+        if now is None:
+            return
+        w = self.sources.get(sip)
+        if w is None:
+            if len(self.sources) >= 2 * SKETCH_CAPACITY:
+                self._prune()  # before inserting, so the new source survives
+            w = self.sources[sip] = _Window()
+        ev, ports = w.events, w.ports
+        if ev and now < ev[-1][0]:
+            now = ev[-1][0]  # slightly out-of-order line: keep the ring sorted
+        ev.append((now, dpt))
+        ports[dpt] += 1
+        horizon = now - self.window
+        while ev and (ev[0][0] <= horizon or len(ev) > SCAN_WINDOW_EVENTS):
+            _, old = ev.popleft()
+            left = ports[old] - 1
+            if left:
+                ports[old] = left
+            else:
+                del ports[old]
+        distinct = len(ports)
+        if distinct > w.peak:
+            if w.peak < self.threshold <= distinct:
+                self.alerts.append((sip, distinct, rec.ts))
+            w.peak, w.peak_at = distinct, rec.ts
+
+    def _prune(self):
+        # keep the SKETCH_CAPACITY most recently active sources; idle ones go first
+        ranked = sorted(self.sources.items(), key=lambda kv: kv[1].events[-1][0] if kv[1].events else 0,
+                        reverse=True)[:SKETCH_CAPACITY]
+        self.sources = dict(ranked)
+
+    def drain(self) -> List[tuple]:
+        out, self.alerts = self.alerts, []
+        return out
+
+    def merge(self, other):
+        # other holds the later lines: its rings carry on, peaks take the max
+        for sip, w in other.sources.items():
+            mine = self.sources.get(sip)
+            if mine is None:
+                self.sources[sip] = w
+                continue
+            if w.peak > mine.peak:
+                mine.peak, mine.peak_at = w.peak, w.peak_at
+            mine.events, mine.ports = w.events, w.ports
+        if len(self.sources) > 2 * SKETCH_CAPACITY:
+            self._prune()
+        self.alerts.extend(other.alerts)
+        return self
+
+    def result(self) -> List[Dict]:
+        """Sources whose peak reached the threshold, highest first (top 10)."""
+        hits = sorted(((sip, w) for sip, w in self.sources.items() if w.peak >= self.threshold),
+                      key=lambda kv: kv[1].peak, reverse=True)[:10]
+        per_min = 60 / self.window
+        return [{"ip": sip, "peak_ports": w.peak, "peak_at": w.peak_at, "window": self.window,
+                 "ports_per_min": round(w.peak * per_min, 1)} for sip, w in hits]
+
+class Engine:
+    """Runs a set of analyzers (default: the registered default ones) over lines in one pass."""
+    __slots__ = ("analyzers", "lines")
+
+    def __init__(self, names: Optional[Sequence[str]] = None):
+        names = names or [n for n, cls in ANALYZERS.items() if cls.default]
+        self.analyzers = {n: ANALYZERS[n]() for n in names}
+        self.lines = 0
+
+    def feed(self, lines: Iterable) -> "Engine":
+        """Add lines (str or LogRecord); call again with appended lines to update."""
+        feeds = [a.feed_columns for a in self.analyzers.values()]
+        it = iter(lines)
+        while True:
+            recs = [as_record(ln) for ln in islice(it, BATCH)]
+            if not recs:
+                break
+            cols = Columns(recs)
+            for f in feeds:
+                f(cols)
+            self.lines += len(recs)
+        return self
+
+    def merge(self, other: "Engine") -> "Engine":
+        """Fold in an Engine with the same analyzers that was fed other lines (e.g. by a worker)."""
+        for name, a in self.analyzers.items():
+            a.merge(other.analyzers[name])
+        self.lines += other.lines
+        return self
+
+    def results(self) -> Dict:
+        return {name: a.result() for name, a in self.analyzers.items()}
+
+def analyze(lines: Iterable, names: Optional[Sequence[str]] = None) -> Dict:
+    """{analyzer name: result} for lines, computed in a single pass."""
+    return Engine(names).feed(lines).results()
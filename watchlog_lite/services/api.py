@@ -0,0 +1,39 @@
+import base64, binascii, struct
+from typing import Dict, Optional, Tuple
+from .logs import as_record
+
+# Opaque paging cursor for the JSON API: direction, inode and byte offset,
+# packed and base64url-encoded. "o" pages towards older lines (offset is the
+# end of the next window), "n" towards newer ones (offset is its start). The
+# inode pins the cursor to one file so a rotated log is detected, not misread.
+CURSOR = struct.Struct("<cQQ")
+OLDER, NEWER = "o", "n"
+
+def encode_cursor(direction: str, ino: int, offset: int) -> str:
+    raw = CURSOR.pack(direction.encode(), ino, offset)
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: str) -> Optional[Tuple[str, int, int]]:
+    """(direction, inode, offset) from a cursor token, or None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        d, ino, offset = CURSOR.unpack(raw)
+    except (ValueError, binascii.Error, struct.error):
+        return None
+    d = d.decode("ascii", "ignore")
+    return (d, ino, offset) if d in (OLDER, NEWER) else None
+
+def record_json(item) -> Dict:
+    """JSON-ready form of a log line: its parse_kv() fields plus the raw text."""
+    rec = as_record(item)
+    return {"fields": rec.kv, "raw": rec.raw}
+
+def suspicious_json(sus: Dict, bt) -> Dict:
+    """analyze_suspicious() / summarize_bittorrent() results with named pairs."""
+    return {
+        "bt_count": sus["bt_count"],
+        "bt_ips": sus["bt_ips"],
+        "bt_top": [{"ip": ip, "hits": c} for ip, c in bt],
+        "scan_suspects": [{"ip": ip, "ports": c} for ip, c in sus["scan_suspects"]],
+        "risky_ports": [{"dport": p, "hits": c} for p, c in sus["risky_ports"]],
+    }
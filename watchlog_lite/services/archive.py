@@ -0,0 +1,411 @@
+import hashlib, os, struct, threading, time, zlib
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from .logs import ARC_SUFFIX, LogRecord, norm_ts
+from .tail import decode
+
+# Archival segments for closed months (<log>.arc, written by tools/archive.py).
+# The log is cut into line-aligned blocks of about BLOCK_SIZE bytes, each
+# zlib-compressed on its own, followed by a block table and a trailer:
+#
+#   block 0 .. block N-1 | N table entries | N bloom filters | trailer
+#
+# Offsets are those of the original file (uncompressed), so cursors, line
+# indexes and rollups work as for a .gz. Each entry carries the block's
+# min/max timestamp and the size of a bloom filter over the src IP, dst IP
+# and dport of its lines; readers skip blocks that cannot hold a line the
+# query or time window keeps, and decompress only the rest.
+MAGIC = b"WLARC1\0\0"
+TRAILER = struct.Struct("<8sQQQ")       # magic, table offset, blocks, uncompressed size
+ENTRY = struct.Struct("<QIQII19s19sI")  # comp off, comp len, uoff, ulen, lines, min ts, max ts, bloom bytes
+BLOCK_SIZE = int(os.environ.get("WG_ARCHIVE_BLOCK", str(256 * 1024)))
+BLOOM_BITS_PER_KEY = 10   # ~1% false positives with BLOOM_K probes
+BLOOM_K = 7
+RANGE_PROBES = 64         # dport ranges up to this wide are probed port by port
+CACHE_MAX = 8
+
+# LogRecord field -> bloom key prefix
+_BLOOM_FIELDS = {"src_ip": "s", "dst_ip": "d", "dport": "p"}
+
+def _probes(key: bytes, nbits: int):
+    h = hashlib.blake2b(key, digest_size=16).digest()
+    h1 = int.from_bytes(h[:8], "little")
+    h2 = int.from_bytes(h[8:], "little") | 1
+    return [(h1 + i * h2) % nbits for i in range(BLOOM_K)]
+
+def _bloom(keys) -> bytes:
+    bits = bytearray(max(8, (len(keys) * BLOOM_BITS_PER_KEY + 7) // 8))
+    nbits = len(bits) * 8
+    for key in keys:
+        for p in _probes(key, nbits):
+            bits[p >> 3] |= 1 << (p & 7)
+    return bytes(bits)
+
+def _bloom_has(bits, key: bytes) -> bool:
+    nbits = len(bits) * 8
+    return all(bits[p >> 3] & (1 << (p & 7)) for p in _probes(key, nbits))
+
+def _record_keys(rec: LogRecord):
+    for field, tag in _BLOOM_FIELDS.items():
+        v = getattr(rec, field)
+        if v is not None:
+            yield f"{tag}{v}".encode()
+
+def bloom_groups(plan) -> Optional[List[List[bytes]]]:
+    """Bloom keys a block must hold (one key of every group) to contain a line plan keeps.
+
+    None when the query cannot be decided per block: no positive terms,
+    or a text term, which keeps a line on its own.
+    """
+    if not plan.has_pos or plan.pos_lits or plan.pos_rx is not None:
+        return None
+    groups = []
+    for k, v in plan.pos_kv:
+        tag = _BLOOM_FIELDS.get(k)
+        if tag and not v.endswith("."):  # prefix matches are not in the filter
+            groups.append([f"{tag}{v}".encode()])
+    for k, lo, hi in plan.pos_ranges:
+        tag = _BLOOM_FIELDS.get(k)
+        if tag and 0 <= hi - lo < RANGE_PROBES:
+            groups.append([f"{tag}{p}".encode() for p in range(lo, hi + 1)])
+    return groups or None
+
+def _block_lines(data: bytes) -> List[bytes]:
+    lines = data.split(b"\n")
+    if lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+class Archive:
+    __slots__ = ("path", "ino", "size", "usize", "comp", "clen", "uoff", "ulen", "lines",
+                 "min_ts", "max_ts", "blooms")
+
+    def __init__(self, path: Path, ino: int, size: int):
+        self.path = Path(path)
+        self.ino = ino
+        self.size = size
+        self.usize = 0
+        self.comp, self.clen = array("Q"), array("Q")
+        self.uoff, self.ulen = array("Q"), array("Q")
+        self.lines = array("Q")
+        self.min_ts: List[str] = []   # "" when the block has no timestamps
+        self.max_ts: List[str] = []
+        self.blooms: List[bytes] = []
+
+    @classmethod
+    def load(cls, path: Path) -> "Archive":
+        """Read the block table of path; raises ValueError if it is not an archive."""
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_size < TRAILER.size:
+                raise ValueError(f"{path}: not a log archive")
+            f.seek(st.st_size - TRAILER.size)
+            magic, table, blocks, usize = TRAILER.unpack(f.read(TRAILER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path}: not a log archive")
+            f.seek(table)
+            meta = f.read(st.st_size - TRAILER.size - table)
+        arc = cls(path, st.st_ino, st.st_size)
+        arc.usize = usize
+        pos = blocks * ENTRY.size
+        for i in range(blocks):
+            comp, clen, uoff, ulen, lines, lo, hi, nb = ENTRY.unpack_from(meta, i * ENTRY.size)
+            arc.comp.append(comp)
+            arc.clen.append(clen)
+            arc.uoff.append(uoff)
+            arc.ulen.append(ulen)
+            arc.lines.append(lines)
+            arc.min_ts.append(lo.rstrip(b"\0").decode("utf-8", "ignore"))
+            arc.max_ts.append(hi.rstrip(b"\0").decode("utf-8", "ignore"))
+            arc.blooms.append(meta[pos:pos + nb])
+            pos += nb
+        return arc
+
+    def __len__(self):
+        return len(self.uoff)
+
+    def find(self, uoff: int) -> int:
+        """Index of the block holding uncompressed offset uoff (len(self) past the end)."""
+        if uoff >= self.usize:
+            return len(self)
+        return max(0, bisect_right(self.uoff, uoff) - 1)
+
+    def may_hold(self, i: int, groups) -> bool:
+        bits = self.blooms[i]
+        return all(any(_bloom_has(bits, key) for key in keys) for keys in groups)
+
+    def blocks(self, start: int = 0, stop: Optional[int] = None, groups=None,
+               reverse: bool = False) -> Iterator[Tuple[int, Optional[bytes]]]:
+        """(index, data) for blocks [start, stop); data is None for blocks the bloom groups rule out."""
+        stop = len(self) if stop is None else stop
+        order = range(stop - 1, start - 1, -1) if reverse else range(start, stop)
+        with open(self.path, "rb") as f:
+            for i in order:
+                if groups is not None and not self.may_hold(i, groups):
+                    yield i, None
+                    continue
+                f.seek(self.comp[i])
+                yield i, zlib.decompress(f.read(self.clen[i]))
+
+    def ranges(self, parts: int) -> List[Tuple[int, int]]:
+        """Split the blocks into up to parts contiguous (start, stop) runs."""
+        step = max(1, -(-len(self) // max(1, parts)))
+        return [(b, min(b + step, len(self))) for b in range(0, len(self), step)]
+
+_CACHE: "OrderedDict[str, Archive]" = OrderedDict()
+_LOCK = threading.Lock()
+
+def get_archive(path: Path) -> Archive:
+    """Block table of an .arc log, cached per (inode, size). Raises FileNotFoundError if path is missing."""
+    st = os.stat(path)
+    key = str(path)
+    with _LOCK:
+        arc = _CACHE.get(key)
+        if arc is None or arc.ino != st.st_ino or arc.size != st.st_size:
+            arc = Archive.load(path)
+        _CACHE[key] = arc
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > CACHE_MAX:
+            _CACHE.popitem(last=False)
+        return arc
+
+# ---------- Readers ----------
+
+def iter_arc(path: Path, uoff: int = 0) -> Iterator[bytes]:
+    """Decompressed bytes of an .arc log from uncompressed offset uoff."""
+    arc = get_archive(path)
+    for i, data in arc.blocks(arc.find(uoff)):
+        yield data[uoff - arc.uoff[i]:] if uoff > arc.uoff[i] else data
+
+def iter_arc_lines(path: Path, uoff: int = 0) -> Iterator[bytes]:
+    """Raw lines (without newline) from uoff, a line start."""
+    for data in iter_arc(path, uoff):
+        for line in _block_lines(data):
+            yield line.rstrip(b"\r")
+
+def arc_tail(path: Path, n: int) -> List[str]:
+    """Last n lines, decompressing only the last blocks."""
+    arc = get_archive(path)
+    parts: List[List[bytes]] = []
+    got = 0
+    if n > 0:
+        for _, data in arc.blocks(reverse=True):
+            parts.append(_block_lines(data))
+            got += len(parts[-1])
+            if got >= n:
+                break
+    lines = [l for part in reversed(parts) for l in part][-n:] if n else []
+    return [decode(l).rstrip("\r") for l in lines]
+
+def arc_scan_backward(path: Path, n: int, plan, end: Optional[int] = None,
+                      max_bytes: Optional[int] = None, max_seconds: Optional[float] = None):
+    """tail.scan_matches() for an archive: (lines, cursor, scanned), skipping blocks by bloom.
+
+    max_bytes bounds the bytes decompressed, so a selective ip=/dport=
+    query reaches much further back than a plain scan.
+    """
+    arc = get_archive(path)
+    if end is None or end > arc.usize:
+        end = arc.usize
+    groups = bloom_groups(plan)
+    pre = plan.prefilter_b
+    deadline = time.monotonic() + max_seconds if max_seconds else None
+    out: List[str] = []
+    scanned = read = 0
+    start = end
+    last = arc.find(end - 1) if end else -1
+    for i, data in arc.blocks(0, last + 1, groups, reverse=True):
+        start = arc.uoff[i]
+        if data is None:
+            scanned += arc.lines[i]
+            continue
+        data = data[:end - start]  # end is a line start
+        read += len(data)
+        lines = _block_lines(data)
+        offs = []
+        p = start
+        for raw in lines:
+            offs.append(p)
+            p += len(raw) + 1
+        for s, raw in zip(reversed(offs), reversed(lines)):
+            scanned += 1
+            if pre is not None and not pre.search(raw):
+                continue
+            line = decode(raw).rstrip("\r")
+            if plan.match(line):
+                out.append(line)
+                if len(out) >= n:
+                    start = s
+                    break
+        if len(out) >= n or (max_bytes and read >= max_bytes) or (deadline and time.monotonic() > deadline):
+            break
+    out.reverse()
+    return out, (start or None), scanned
+
+def arc_scan_forward(path: Path, pos: int, n: int, plan, max_bytes: Optional[int] = None):
+    """tail.scan_forward() for an archive: (lines, next offset), skipping blocks by bloom."""
+    arc = get_archive(path)
+    groups = bloom_groups(plan)
+    pre = plan.prefilter_b
+    out: List[str] = []
+    end = pos
+    read = 0
+    for i, data in arc.blocks(arc.find(pos), groups=groups):
+        b0 = arc.uoff[i]
+        if data is None:
+            end = b0 + arc.ulen[i]
+            continue
+        if pos > b0:
+            data, b0 = data[pos - b0:], pos
+        read += len(data)
+        end = b0
+        for raw in _block_lines(data):
+            end = min(end + len(raw) + 1, arc.usize)
+            if pre is not None and not pre.search(raw):
+                continue
+            line = decode(raw).rstrip("\r")
+            if plan.match(line):
+                out.append(line)
+                if len(out) >= n:
+                    return out, end
+        if max_bytes and read >= max_bytes:
+            break
+    return out, max(end, pos)
+
+def arc_time_range(path: Path, lo_ts: Optional[str], hi_ts: Optional[str], n: int):
+    """(lines, truncated) with lo_ts <= ts <= hi_ts; blocks ending before lo_ts are not read."""
+    arc = get_archive(path)
+    start = 0
+    if lo_ts:
+        while start < len(arc) and arc.max_ts[start] < lo_ts:
+            start += 1
+    out: List[str] = []
+    started = not lo_ts
+    for _, data in arc.blocks(start):
+        for raw in _block_lines(data):
+            line = decode(raw).rstrip("\r")
+            ts = norm_ts(LogRecord(line).ts)
+            if not started:
+                if ts is None or ts < lo_ts:
+                    continue
+                started = True
+            if ts is not None and hi_ts and ts > hi_ts:
+                return out, False
+            if len(out) >= n:
+                return out, True
+            out.append(line)
+    return out, False
+
+def arc_search(path: Path, start: int, stop: int, plan) -> List[str]:
+    """Lines of blocks [start, stop) that plan keeps, skipping blocks by bloom."""
+    arc = get_archive(path)
+    pre = plan.prefilter_b
+    out: List[str] = []
+    for _, data in arc.blocks(start, stop, bloom_groups(plan)):
+        if data is None:
+            continue
+        for raw in _block_lines(data):
+            if pre is not None and not pre.search(raw):
+                continue
+            line = decode(raw).rstrip("\r")
+            if plan.match(line):
+                out.append(line)
+    return out
+
+# ---------- Closed-month archives (.gz or .arc) ----------
+
+def iter_archive(path: Path, uoff: int = 0) -> Iterator[bytes]:
+    """Uncompressed bytes of a .gz or .arc log from uoff."""
+    if str(path).endswith(ARC_SUFFIX):
+        return iter_arc(path, uoff)
+    from .gzindex import iter_gz
+    return iter_gz(path, uoff)
+
+def archive_size(path: Path) -> int:
+    """Uncompressed size of a .gz or .arc log."""
+    if str(path).endswith(ARC_SUFFIX):
+        return get_archive(path).usize
+    from .gzindex import get_gz_index
+    return get_gz_index(path).usize
+
+# ---------- Writer ----------
+
+class _BlockWriter:
+    __slots__ = ("f", "block_size", "entries", "blooms", "buf", "size", "lines", "keys", "lo", "hi", "usize")
+
+    def __init__(self, f, block_size: int):
+        self.f = f
+        self.block_size = block_size
+        self.entries: List[bytes] = []
+        self.blooms: List[bytes] = []
+        self.buf: List[bytes] = []
+        self.size = 0
+        self.lines = 0
+        self.keys = set()
+        self.lo = self.hi = ""
+        self.usize = 0
+
+    def add(self, raw: bytes, nl: bool = True) -> None:
+        rec = LogRecord(decode(raw).rstrip("\r"))
+        self.keys.update(_record_keys(rec))
+        ts = norm_ts(rec.ts)
+        if ts:
+            if not self.lo or ts < self.lo:
+                self.lo = ts
+            if ts > self.hi:
+                self.hi = ts
+        self.buf.append(raw + b"\n" if nl else raw)
+        self.size += len(raw) + 1
+        self.lines += 1
+        if self.size >= self.block_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.buf:
+            return
+        data = b"".join(self.buf)
+        comp = zlib.compress(data, 6)
+        bloom = _bloom(self.keys)
+        self.entries.append(ENTRY.pack(self.f.tell(), len(comp), self.usize, len(data), self.lines,
+                                       self.lo.encode(), self.hi.encode(), len(bloom)))
+        self.blooms.append(bloom)
+        self.f.write(comp)
+        self.usize += len(data)
+        self.buf, self.size, self.lines, self.keys, self.lo, self.hi = [], 0, 0, set(), "", ""
+
+    def close(self) -> None:
+        self.flush()
+        table = self.f.tell()
+        self.f.write(b"".join(self.entries))
+        self.f.write(b"".join(self.blooms))
+        self.f.write(TRAILER.pack(MAGIC, table, len(self.entries), self.usize))
+
+def _read_chunks(path: Path) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        yield from iter(lambda: f.read(1 << 20), b"")
+
+def write_archive(src: Path, dst: Path, block_size: int = BLOCK_SIZE) -> Archive:
+    """Convert a plain or .gz log into an .arc at dst (written atomically); returns its table."""
+    src, dst = Path(src), Path(dst)
+    chunks = iter_archive(src) if str(src).endswith(".gz") else _read_chunks(src)
+    tmp = dst.with_name(dst.name + f".{os.getpid()}.tmp")
+    try:
+        with tmp.open("wb") as f:
+            w = _BlockWriter(f, block_size)
+            partial = b""
+            for chunk in chunks:
+                parts = (partial + chunk).split(b"\n")
+                partial = parts.pop()
+                for raw in parts:
+                    w.add(raw)
+            if partial:  # keep a missing final newline missing
+                w.add(partial, nl=False)
+            w.close()
+        os.replace(tmp, dst)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return get_archive(dst)
@@ -0,0 +1,144 @@
+import socket
+from array import array
+from collections import Counter
+from itertools import compress
+from typing import Dict, List, Optional, Sequence, Tuple
+from .detect import PAT_BT_LOWER
+
+try:
+    import numpy as np
+except ImportError:  # optional: the array/Counter path gives the same results
+    np = None
+
+# Column batches for the analytics engine: a slice of LogRecords as parallel
+# arrays, so the panels aggregate with a handful of C-level passes instead of
+# per-line Python. IPv4 addresses are uint32 (0 = absent or not a plain
+# dotted quad), dports int32 (-1 = absent; malformed ports can exceed
+# uint16), actions small codes. With numpy installed masks and counts are
+# vectorized; otherwise the same functions run on array/itertools. Results
+# keep first-seen order, like a Counter fed line by line.
+ACT_OTHER, ACT_ALLOW, ACT_DENY = 0, 1, 2
+_ACTIONS = {"allow": ACT_ALLOW, "deny": ACT_DENY}
+
+_IP4: Dict[str, int] = {}
+IP4_CACHE_MAX = 1 << 16
+
+def ip4(ip: Optional[str]) -> int:
+    """uint32 for a dotted-quad IPv4 string, 0 for anything else (cached)."""
+    if not ip:
+        return 0
+    v = _IP4.get(ip)
+    if v is None:
+        try:
+            packed = socket.inet_aton(ip)
+            # inet_aton also takes "10.1", "0x0a.1.1.1", ...: only canonical quads
+            v = int.from_bytes(packed, "big") if socket.inet_ntoa(packed) == ip else 0
+        except (OSError, UnicodeError, ValueError):
+            v = 0
+        if len(_IP4) >= IP4_CACHE_MAX:
+            _IP4.clear()
+        _IP4[ip] = v
+    return v
+
+def ip4_str(v: int) -> str:
+    return socket.inet_ntoa(v.to_bytes(4, "big"))
+
+def bt_flags(raws: Sequence[str]) -> bytearray:
+    """1 per line matching PAT_BT: one case-sensitive scan of the lowercased batch."""
+    flags = bytearray(len(raws))
+    low = "\n".join(raws).lower()
+    row = last = 0
+    for m in PAT_BT_LOWER.finditer(low):
+        row += low.count("\n", last, m.start())
+        last = m.start()
+        flags[row] = 1
+    return flags
+
+class Columns:
+    """A batch of LogRecords as arrays: src_ip (uint32), dport (int32), action code, BT flag.
+
+    odd lists the rows whose src_ip is set but is not a plain IPv4 address;
+    analyzers handle those rows per record.
+    """
+    __slots__ = ("recs", "bt", "src", "dport", "action", "odd")
+
+    def __init__(self, recs: List, bt: Optional[bytearray] = None):
+        self.recs = recs
+        self.bt = bt if bt is not None else bt_flags([r.raw for r in recs])
+        self.src, self.dport, self.action = array("I"), array("i"), array("B")
+        self.odd: List[int] = []
+        src, dport, action = self.src.append, self.dport.append, self.action.append
+        for i, rec in enumerate(recs):
+            s = rec.src_ip
+            v = ip4(s)
+            if s and not v:
+                self.odd.append(i)
+            src(v)
+            p = rec.dport
+            dport(-1 if p is None else p)
+            a = rec.action
+            action(_ACTIONS.get(a.lower(), ACT_OTHER) if a else ACT_OTHER)
+
+    def __len__(self):
+        return len(self.recs)
+
+    def bt_rows(self) -> List[int]:
+        return [i for i, f in enumerate(self.bt) if f]
+
+# ---------- Vector helpers (numpy when available) ----------
+
+def _np(col):
+    return np.frombuffer(col, dtype={"I": np.uint32, "i": np.int32, "B": np.uint8}[col.typecode]) \
+        if isinstance(col, array) else np.frombuffer(col, dtype=np.uint8)
+
+def private_mask(src):
+    """Rows whose src is in 10/8, 172.16/12, 192.168/16 or 127/8 (as detect._is_private_ip)."""
+    if np is not None:
+        a = _np(src)
+        hi = a >> 24
+        return (hi == 10) | (hi == 127) | ((a >> 16) == 0xC0A8) | ((a >> 20) == 0xAC1)
+    return [(v >> 24) in (10, 127) or (v >> 16) == 0xC0A8 or (v >> 20) == 0xAC1 for v in src]
+
+def prefix_mask(src, net: int, bits: int):
+    """Rows whose address is in net/bits."""
+    shift = 32 - bits
+    if np is not None:
+        return (_np(src) >> shift) == (net >> shift)
+    key = net >> shift
+    return [(v >> shift) == key for v in src]
+
+def port_mask(dport, ports=None):
+    """Rows with a dport (in ports, if given)."""
+    if np is not None:
+        a = _np(dport)
+        return np.isin(a, list(ports)) if ports is not None else a >= 0
+    if ports is not None:
+        return [p in ports for p in dport]
+    return [p >= 0 for p in dport]
+
+def both(m1, m2):
+    if np is not None:
+        return m1 & m2
+    return [a and b for a, b in zip(m1, m2)]
+
+def equals(col, value):
+    if np is not None:
+        return _np(col) == value
+    return [v == value for v in col]
+
+def count_values(col, mask) -> List[Tuple[int, int]]:
+    """[(value, count), ...] over the masked rows, in first-seen order."""
+    if np is not None:
+        vals, first, counts = np.unique(_np(col)[mask], return_index=True, return_counts=True)
+        order = np.argsort(first, kind="stable")
+        return list(zip(vals[order].tolist(), counts[order].tolist()))
+    return list(Counter(compress(col, mask)).items())
+
+def distinct_pairs(a, b, mask) -> List[Tuple[int, int]]:
+    """Distinct (a, b) pairs over the masked rows, in first-seen order."""
+    if np is not None:
+        keys = (_np(a).astype(np.uint64) << np.uint64(32)) | _np(b).astype(np.uint32).astype(np.uint64)
+        vals, first = np.unique(keys[mask], return_index=True)
+        vals = vals[np.argsort(first, kind="stable")]
+        return list(zip((vals >> np.uint64(32)).tolist(), (vals & np.uint64(0xFFFFFFFF)).astype(np.int32).tolist()))
+    return list(dict.fromkeys(compress(zip(a, b), mask)))
@@ -0,0 +1,300 @@
+import os, struct, threading, time, zlib
+from array import array
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from .logs import sidecar_path
+from .tail import decode
+
+# Seek points for rotated .gz logs so reads can start decompressing near the
+# requested region instead of at byte 0.
+#
+# Python's zlib cannot prime a raw inflater at an arbitrary bit offset, so the
+# persisted points (<log>.gz.gzi) are gzip member starts: (compressed offset,
+# uncompressed offset, starts-on-a-line flag). `tools/gzindex.py --rewrite`
+# recompresses an archive into line-aligned ~4 MiB members (still a normal
+# .gz for zcat/gzip) to make those dense. Within a process, single-member
+# archives additionally get decompressobj.copy() checkpoints every MEM_SPAN:
+# from the indexing pass, or after a sidecar load from the first read that
+# decompresses past them.
+SUFFIX = ".gzi"
+MAGIC = b"WLGZI1\0\0"
+HEADER = struct.Struct("<8sQQQ")  # magic, inode, gz size, uncompressed size
+READ = 1 << 20
+OUT_CAP = 4 << 20
+MEM_SPAN = 16 << 20
+CACHE_MAX = 8
+
+def _inflate(path: Path, comp_off: int = 0, d=None):
+    """Yield (out, comp_pos, d, member_start) while decompressing path from comp_off.
+
+    comp_pos is the compressed offset up to which d has consumed input, so
+    (uncompressed offset after out, comp_pos, d.copy()) is a valid restart
+    point. member_start is set on the first chunk of each later gzip member.
+    """
+    d = d or zlib.decompressobj(31)
+    member_start = None
+    with open(path, "rb") as f:
+        f.seek(comp_off)
+        pos = comp_off
+        buf = f.read(READ)
+        while buf:
+            try:
+                out = d.decompress(buf, OUT_CAP)
+            except zlib.error:
+                return  # trailing padding/garbage after the last member
+            rest = d.unused_data if d.eof else d.unconsumed_tail
+            pos += len(buf) - len(rest)
+            yield out, pos, d, member_start
+            member_start = None
+            if d.eof:
+                d = zlib.decompressobj(31)
+                member_start = pos
+            buf = rest or f.read(READ)
+
+class GzIndex:
+    __slots__ = ("path", "ino", "gz_size", "usize", "m_comp", "m_uoff", "m_line", "points")
+
+    def __init__(self, path: Path, ino: int, gz_size: int):
+        self.path = Path(path)
+        self.ino = ino
+        self.gz_size = gz_size
+        self.usize = 0
+        self.m_comp = array("Q", [0])   # member start, compressed offset
+        self.m_uoff = array("Q", [0])   # member start, uncompressed offset
+        self.m_line = array("B", [1])   # 1 if the member starts on a line boundary
+        self.points: List[Tuple[int, int, object]] = []  # in-memory (uoff, comp, decompressobj)
+
+    @classmethod
+    def build(cls, path: Path, ino: int, gz_size: int) -> "GzIndex":
+        idx = cls(path, ino, gz_size)
+        uoff = last = 0
+        prev_nl = True
+        for out, pos, d, member_start in _inflate(path):
+            if member_start is not None:
+                idx.m_comp.append(member_start)
+                idx.m_uoff.append(uoff)
+                idx.m_line.append(1 if prev_nl else 0)
+            uoff += len(out)
+            if out:
+                prev_nl = out[-1:] == b"\n"
+            if uoff - last >= MEM_SPAN and not d.eof:
+                idx.points.append((uoff, pos, d.copy()))
+                last = uoff
+        idx.usize = uoff
+        return idx
+
+    @classmethod
+    def load(cls, path: Path, ino: int, gz_size: int) -> Optional["GzIndex"]:
+        try:
+            data = sidecar_path(path, SUFFIX).read_bytes()
+            magic, s_ino, s_size, usize = HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return None
+        if magic != MAGIC or s_ino != ino or s_size != gz_size:
+            return None
+        idx = cls(path, ino, gz_size)
+        idx.usize = usize
+        body = array("Q")
+        body.frombytes(data[HEADER.size:])
+        idx.m_comp, idx.m_uoff = body[0::3], body[1::3]
+        idx.m_line = array("B", body[2::3])
+        return idx
+
+    def save(self) -> None:
+        body = array("Q")
+        for c, u, l in zip(self.m_comp, self.m_uoff, self.m_line):
+            body.extend((c, u, l))
+        try:
+            out = sidecar_path(self.path, SUFFIX)
+            tmp = out.with_name(out.name + f".{os.getpid()}.tmp")
+            with tmp.open("wb") as f:
+                f.write(HEADER.pack(MAGIC, self.ino, self.gz_size, self.usize))
+                f.write(body.tobytes())
+            os.replace(tmp, out)
+        except OSError:
+            pass
+
+    def checkpoint(self, uoff: int, comp: int, d) -> None:
+        """Remember (uoff, comp, d) if it is MEM_SPAN past the last in-memory point."""
+        if uoff - (self.points[-1][0] if self.points else 0) < MEM_SPAN or d.eof:
+            return
+        with _LOCK:
+            if uoff - (self.points[-1][0] if self.points else 0) >= MEM_SPAN:
+                self.points.append((uoff, comp, d.copy()))
+
+    def seek_point(self, uoff: int):
+        """(uncompressed offset, compressed offset, decompressobj) of the best restart point <= uoff."""
+        best = (0, 0, None)
+        for u, c in zip(self.m_uoff, self.m_comp):
+            if u > uoff:
+                break
+            best = (u, c, None)
+        for u, c, d in self.points:
+            if u > uoff:
+                break
+            if u >= best[0]:
+                best = (u, c, d.copy())
+        return best
+
+    def line_ranges(self, parts: int) -> List[Tuple[int, int, int]]:
+        """Split into up to parts (comp start, uoff start, uoff end) ranges at line-aligned members."""
+        cuts = [(c, u) for c, u, l in zip(self.m_comp, self.m_uoff, self.m_line) if l]
+        step = max(1, len(cuts) // max(1, parts))
+        starts = cuts[::step]
+        return [(c, u, starts[i + 1][1] if i + 1 < len(starts) else self.usize)
+                for i, (c, u) in enumerate(starts)]
+
+_CACHE: "OrderedDict[str, GzIndex]" = OrderedDict()
+_LOCK = threading.Lock()
+_BUILDING: Dict[str, threading.Lock] = {}  # per-path locks for load/build
+
+def _cached(key: str, st) -> Optional[GzIndex]:
+    # caller holds _LOCK
+    idx = _CACHE.get(key)
+    if idx is None or idx.ino != st.st_ino or idx.gz_size != st.st_size:
+        return None
+    _CACHE.move_to_end(key)
+    return idx
+
+def get_gz_index(path: Path) -> GzIndex:
+    """Index for a .gz log: cached, else loaded from its sidecar, else built by one full pass.
+
+    Loading and building hold only a per-path lock, so other archives stay
+    readable meanwhile. Raises FileNotFoundError if path is missing.
+    """
+    st = os.stat(path)
+    key = str(path)
+    with _LOCK:
+        idx = _cached(key, st)
+        if idx is not None:
+            return idx
+        building = _BUILDING.setdefault(key, threading.Lock())
+    with building:
+        with _LOCK:
+            idx = _cached(key, st)  # built by the thread we waited for
+        if idx is None:
+            idx = GzIndex.load(path, st.st_ino, st.st_size)
+            if idx is None:
+                idx = GzIndex.build(path, st.st_ino, st.st_size)
+                idx.save()
+            with _LOCK:
+                _CACHE[key] = idx
+                while len(_CACHE) > CACHE_MAX:
+                    _CACHE.popitem(last=False)
+                _BUILDING.pop(key, None)
+    return idx
+
+def iter_gz(path: Path, uoff: int = 0, idx: Optional[GzIndex] = None) -> Iterator[bytes]:
+    """Decompressed bytes of path from uncompressed offset uoff, starting at the nearest seek point."""
+    idx = idx or get_gz_index(path)
+    start, comp, d = idx.seek_point(uoff)
+    skip = uoff - start
+    pos = start
+    for out, comp_pos, dd, _ in _inflate(path, comp, d):
+        pos += len(out)
+        idx.checkpoint(pos, comp_pos, dd)
+        if skip:
+            if len(out) <= skip:
+                skip -= len(out)
+                continue
+            out, skip = out[skip:], 0
+        if out:
+            yield out
+
+def iter_gz_lines(path: Path, uoff: int = 0, end: Optional[int] = None,
+                  idx: Optional[GzIndex] = None) -> Iterator[bytes]:
+    """Raw lines (without newline) starting at uoff, a line start; stops at the first line starting at or after end."""
+    pos = uoff
+    partial = b""
+    for chunk in iter_gz(path, uoff, idx):
+        parts = (partial + chunk).split(b"\n")
+        partial = parts.pop()
+        for line in parts:
+            if end is not None and pos >= end:
+                return
+            pos += len(line) + 1
+            yield line.rstrip(b"\r")
+    if partial and (end is None or pos < end):
+        yield partial.rstrip(b"\r")
+
+def gz_tail(path: Path, n: int) -> List[str]:
+    """Last n lines of a .gz log, decompressing only from a seek point near the end."""
+    idx = get_gz_index(path)
+    want = max(n * 256, 1 << 16)
+    while True:
+        start = max(0, idx.usize - want)
+        dq = deque(maxlen=n + 1)
+        seen = 0
+        partial = b""
+        for chunk in iter_gz(path, start, idx):
+            parts = (partial + chunk).split(b"\n")
+            partial = parts.pop()
+            dq.extend(parts)
+            seen += len(parts)
+        if partial:
+            dq.append(partial)
+            seen += 1
+        # when starting mid-file the first line may be cut: need n complete ones
+        if start == 0 or seen > n:
+            lines = list(dq)[-n:] if n else []
+            return [l.decode("utf-8", "ignore").rstrip("\r") for l in lines]
+        want *= 4
+
+def _gz_bytes(path: Path, lo: int, hi: int, idx: GzIndex) -> bytes:
+    """Uncompressed bytes [lo, hi) of path."""
+    buf = bytearray()
+    for chunk in iter_gz(path, lo, idx):
+        buf += chunk
+        if len(buf) >= hi - lo:
+            break
+    return bytes(buf[:hi - lo])
+
+def gz_scan_backward(path: Path, n: int, plan, end: Optional[int] = None,
+                     max_bytes: Optional[int] = None, max_seconds: Optional[float] = None):
+    """tail.scan_matches() for a .gz log: (lines, cursor, scanned), offsets uncompressed.
+
+    Walks back in windows of about MEM_SPAN bytes, each decompressed from
+    the nearest seek point, so a continued scan does not restart at byte 0.
+    """
+    idx = get_gz_index(path)
+    if end is None or end > idx.usize:
+        end = idx.usize
+    pre = plan.prefilter_b
+    deadline = time.monotonic() + max_seconds if max_seconds else None
+    out: List[str] = []
+    scanned = read = 0
+    want = MEM_SPAN
+    while end > 0:
+        lo = max(0, end - want)
+        data = _gz_bytes(path, lo, end, idx)
+        if lo:
+            cut = data.find(b"\n") + 1  # the window's first line may be cut
+            if not cut:
+                want *= 2
+                continue
+            data, lo = data[cut:], lo + cut
+        read += len(data)
+        lines = data.split(b"\n")
+        if data.endswith(b"\n"):
+            lines.pop()
+        offs = []
+        p = lo
+        for raw in lines:
+            offs.append(p)
+            p += len(raw) + 1
+        for s, raw in zip(reversed(offs), reversed(lines)):
+            scanned += 1
+            if pre is not None and not pre.search(raw):
+                continue
+            line = decode(raw).rstrip("\r")
+            if plan.match(line):
+                out.append(line)
+                if len(out) >= n:
+                    out.reverse()
+                    return out, (s or None), scanned
+        end = lo
+        if (max_bytes and read >= max_bytes) or (deadline and time.monotonic() > deadline):
+            break
+    out.reverse()
+    return out, (end or None), scanned
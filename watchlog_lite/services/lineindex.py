@@ -0,0 +1,172 @@
+import os, struct, threading
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from .logs import sidecar_path, is_archive, ARC_SUFFIX
+from .tail import mapped, iter_lines, decode
+from .gzindex import iter_gz_lines
+from .archive import archive_size, iter_archive, iter_arc_lines
+
+# Sidecar index of line start offsets, one entry every STEP lines, stored as
+# <log>.lidx: header (magic, step, inode, indexed bytes, complete lines)
+# followed by uint64 offsets. It is extended in place as the log grows.
+STEP = int(os.environ.get("WG_LINE_INDEX_STEP", "1000"))
+MAGIC = b"WLIX1\0\0\0"
+HEADER = struct.Struct("<8sQQQQ")
+SUFFIX = ".lidx"
+
+class LineIndex:
+    __slots__ = ("path", "step", "ino", "size", "lines", "offsets")
+
+    def __init__(self, path: Path, step: int = STEP, ino: int = 0):
+        self.path = Path(path)
+        self.step = step
+        self.ino = ino
+        self.size = 0                   # bytes covered, always ends on a line boundary
+        self.lines = 0                  # complete lines within size
+        self.offsets = array("Q", [0])  # offsets[i] = start of line i*step
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["LineIndex"]:
+        try:
+            data = sidecar_path(path, SUFFIX).read_bytes()
+            magic, step, ino, size, lines = HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return None
+        if magic != MAGIC:
+            return None
+        idx = cls(path, step, ino)
+        idx.size, idx.lines = size, lines
+        idx.offsets = array("Q")
+        idx.offsets.frombytes(data[HEADER.size:])
+        return idx
+
+    def save(self) -> None:
+        try:
+            out = sidecar_path(self.path, SUFFIX)
+            tmp = out.with_name(out.name + f".{os.getpid()}.tmp")
+            with tmp.open("wb") as f:
+                f.write(HEADER.pack(MAGIC, self.step, self.ino, self.size, self.lines))
+                f.write(self.offsets.tobytes())
+            os.replace(tmp, out)
+        except OSError:
+            pass  # the index is an optimisation; keep serving from memory
+
+    def extend(self, mm, end: int) -> bool:
+        """Index the complete lines in mm[self.size:end]; True if any were added."""
+        pos, lines, step, offsets = self.size, self.lines, self.step, self.offsets
+        find = mm.find
+        while True:
+            nl = find(b"\n", pos, end)
+            if nl < 0:
+                break
+            pos = nl + 1
+            lines += 1
+            if not lines % step:
+                offsets.append(pos)
+        changed = lines != self.lines
+        self.size, self.lines = pos, lines
+        return changed
+
+    def extend_chunks(self, chunks) -> bool:
+        """Like extend(), for a stream of byte chunks starting at self.size (e.g. a .gz)."""
+        base, pos, lines, step, offsets = self.size, self.size, self.lines, self.step, self.offsets
+        for chunk in chunks:
+            i = chunk.find(b"\n")
+            while i >= 0:
+                pos = base + i + 1
+                lines += 1
+                if not lines % step:
+                    offsets.append(pos)
+                i = chunk.find(b"\n", i + 1)
+            base += len(chunk)
+        changed = lines != self.lines
+        self.size, self.lines = pos, lines
+        return changed
+
+    def line_offset(self, mm, line: int) -> int:
+        """Byte offset where line (0-based) starts: one lookup plus < step finds."""
+        pos = self.offsets[line // self.step]
+        for _ in range(line % self.step):
+            pos = mm.find(b"\n", pos) + 1
+        return pos
+
+_CACHE: Dict[str, LineIndex] = {}
+_LOCK = threading.Lock()  # guards _CACHE and _PATH_LOCKS only
+_PATH_LOCKS: Dict[str, threading.Lock] = {}
+
+def _path_lock(key: str) -> threading.Lock:
+    """Serializes loading and extending one log's index; other logs are not blocked."""
+    with _LOCK:
+        return _PATH_LOCKS.setdefault(key, threading.Lock())
+
+def get_index(path: Path) -> Optional[LineIndex]:
+    """Up-to-date LineIndex for path (loaded from / saved to its sidecar), or None if missing.
+
+    Building an archive's index decompresses it once; that holds only
+    this path's lock.
+    """
+    key = str(path)
+    with _path_lock(key):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            with _LOCK:
+                _CACHE.pop(key, None)
+            return None
+        with _LOCK:
+            idx = _CACHE.get(key)
+        idx = idx or LineIndex.load(path)
+        if is_archive(path):
+            # offsets are uncompressed; the archive itself never grows
+            usize = archive_size(path)
+            if idx is None or idx.ino != st.st_ino or idx.size > usize or idx.step != STEP:
+                idx = LineIndex(path, STEP, st.st_ino)
+            if usize > idx.size and idx.extend_chunks(iter_archive(path, idx.size)):
+                idx.save()
+        else:
+            if idx is None or idx.ino != st.st_ino or st.st_size < idx.size or idx.step != STEP:
+                idx = LineIndex(path, STEP, st.st_ino)  # new, rotated or truncated file
+            if st.st_size > idx.size:
+                with mapped(path, st.st_size) as mm:
+                    if idx.extend(mm, st.st_size):
+                        idx.save()
+        with _LOCK:
+            _CACHE[key] = idx
+        return idx
+
+def read_lines(path: Path, start: int, count: int) -> Optional[Tuple[List[str], int]]:
+    """Lines [start, start+count) of path with a single seek, plus the total line count."""
+    idx = get_index(path)
+    if idx is None:
+        return None
+    out: List[str] = []
+    if is_archive(path):
+        total = idx.lines + (1 if archive_size(path) > idx.size else 0)
+        if start >= total or count <= 0:
+            return out, total
+        skip = start % idx.step
+        uoff = idx.offsets[start // idx.step]
+        lines = iter_arc_lines(path, uoff) if str(path).endswith(ARC_SUFFIX) else iter_gz_lines(path, uoff)
+        for raw in lines:
+            if skip:
+                skip -= 1
+                continue
+            out.append(decode(raw))
+            if len(out) >= count:
+                break
+        return out, total
+    with mapped(path) as mm:
+        total = idx.lines + (1 if len(mm) > idx.size else 0)  # trailing unterminated line
+        if start >= total or count <= 0:
+            return out, total
+        it = iter_lines(mm, idx.line_offset(mm, start))
+        try:
+            for mv in it:
+                out.append(decode(mv))
+                mv.release()
+                if len(out) >= count:
+                    break
+        finally:
+            it.close()
+    return out, total
@@ -1,17 +1,29 @@
-import os, re, html, gzip
+import os, re, html
 import collections
 import glob
+import threading
 from pathlib import Path
 from typing import List, Tuple, Optional
+from .tail import mapped, tail_offset, iter_lines, decode, tail_lines, scan_matches, bisect_lines, scan_forward
 
 # Base path for logs
 BASE = Path(os.environ.get("WG_LOG_BASE", "/var/log/watchguard"))
 
+# Where sidecar indexes go when the log directory itself is not writable
+INDEX_DIR = Path(os.environ.get("WG_INDEX_DIR", "/var/tmp/watchlog-index"))
+
+# Budget for one backwards "last N matches" scan (see tail_matching)
+SCAN_MAX_BYTES = int(os.environ.get("WG_SCAN_MAX_BYTES", str(512 * 1024 * 1024)))
+SCAN_MAX_SECONDS = float(os.environ.get("WG_SCAN_MAX_SECONDS", "3"))
+
 # Patterns
 RE_IP    = re.compile(r'(?:src(?:_ip)?=|saddr=)(\d+\.\d+\.\d+\.\d+)')
 RE_DPORT = re.compile(r'(?:d(?:st_)?port=|dpt=)(\d{1,5})')
 KV       = re.compile(r'(\w+)=([^\s]+)')
 
+# Closed months converted by tools/archive.py (see archive.py)
+ARC_SUFFIX = ".arc"
+
 def list_hosts() -> List[str]:
     if not BASE.exists():
         return []
@@ -24,37 +36,267 @@ def list_months(host: str) -> List[str]:
     return sorted([p.name for p in base.iterdir() if p.is_dir()])
 
 def pick_log_path(host: str, ym: str) -> Path:
-    return BASE / host / ym / "watchguard.log"
+    path = BASE / host / ym / "watchguard.log"
+    if not path.exists():
+        # closed months are often rotated to watchguard.log.gz, or converted
+        # to a block archive (watchguard.log.arc), which is preferred
+        for suffix in (ARC_SUFFIX, ".gz"):
+            alt = path.with_name(path.name + suffix)
+            if alt.exists():
+                return alt
+    return path
+
+def is_archive(path: Path) -> bool:
+    """True for a compressed closed month (.gz or .arc); offsets into it are uncompressed."""
+    return str(path).endswith((".gz", ARC_SUFFIX))
+
+def sidecar_path(path: Path, suffix: str) -> Path:
+    """Location of an index file for path: next to it if writable, else under INDEX_DIR."""
+    path = Path(path)
+    if os.access(path.parent, os.W_OK):
+        return path.with_name(path.name + suffix)
+    try:
+        rel = path.resolve().relative_to(BASE.resolve())
+    except ValueError:
+        rel = Path(*path.resolve().parts[1:])
+    out = INDEX_DIR / (str(rel) + suffix)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    return out
 
 def tail_file(path: Path, n: int) -> Optional[List[str]]:
     """Efficiently read last n lines from a potentially large file."""
     try:
         # Support .gz if needed
         if str(path).endswith('.gz'):
-            from collections import deque
-            dq = deque(maxlen=n)
-            with gzip.open(path, 'rt', errors='ignore') as f:
-                for line in f:
-                    dq.append(line.rstrip('\n'))
-            return list(dq)
+            from .gzindex import gz_tail
+            return gz_tail(path, n)
+        if str(path).endswith(ARC_SUFFIX):
+            from .archive import arc_tail
+            return arc_tail(path, n)
+
+        return tail_lines(path, n)
+    except FileNotFoundError:
+        return None
+
+def tail_matching(path: Path, n: int, q: str, before: Optional[int] = None):
+    """Scan backwards from before (default: end of file) until n lines match q.
+
+    Returns (lines, cursor, scanned) or None if the file is missing; cursor
+    is the byte offset to continue from (None once the start was reached).
+    The scan is bounded by SCAN_MAX_BYTES / SCAN_MAX_SECONDS.
+    """
+    from .query import compile_query
+    plan = compile_query(q or "")
+    try:
+        if str(path).endswith('.gz'):
+            from .gzindex import gz_scan_backward
+            return gz_scan_backward(path, n, plan, before, SCAN_MAX_BYTES, SCAN_MAX_SECONDS)
+        if str(path).endswith(ARC_SUFFIX):
+            from .archive import arc_scan_backward
+            return arc_scan_backward(path, n, plan, before, SCAN_MAX_BYTES, SCAN_MAX_SECONDS)
+        return scan_matches(path, n, plan.match, before, SCAN_MAX_BYTES, SCAN_MAX_SECONDS,
+                            plan.prefilter_b)
+    except FileNotFoundError:
+        return None
+
+def read_matching_after(path: Path, pos: int, n: int, q: str):
+    """Scan forwards from byte offset pos (a line start) until n lines match q.
+
+    Returns (lines, next offset) or None if the file is missing; next offset
+    is just past the last line examined. Only complete lines of a live log
+    are read, and the scan is bounded by SCAN_MAX_BYTES. For an archive
+    offsets are into the uncompressed stream.
+    """
+    from .query import compile_query
+    plan = compile_query(q or "")
+    try:
+        if str(path).endswith(ARC_SUFFIX):
+            from .archive import arc_scan_forward
+            return arc_scan_forward(path, pos, n, plan, SCAN_MAX_BYTES)
+        if not str(path).endswith('.gz'):
+            return scan_forward(path, pos, n, plan.match, SCAN_MAX_BYTES)
+        from .gzindex import iter_gz
+        out: List[str] = []
+        end, partial = pos, b""
+        for chunk in iter_gz(path, pos):
+            parts = (partial + chunk).split(b"\n")
+            partial = parts.pop()
+            for raw in parts:
+                end += len(raw) + 1
+                line = decode(raw).rstrip("\r")
+                if plan.match(line):
+                    out.append(line)
+                    if len(out) >= n:
+                        return out, end
+            if end - pos >= SCAN_MAX_BYTES:
+                return out, end
+        if partial:  # an archive's last line may lack its newline
+            end += len(partial)
+            line = decode(partial).rstrip("\r")
+            if plan.match(line):
+                out.append(line)
+        return out, end
+    except FileNotFoundError:
+        return None
+
+def norm_ts(ts: Optional[str], upper: bool = False) -> Optional[str]:
+    """Normalize a timestamp (or a prefix like "2025-01-15 14:00") to "YYYY-MM-DD HH:MM:SS".
+
+    Missing trailing parts are filled with the lowest value, or the highest
+    when upper is set, so until=14:20 includes 14:20:59.
+    """
+    if not ts:
+        return None
+    s = ts.strip().replace("T", " ").rstrip("Z")[:19]
+    tmpl = "9999-12-31 23:59:59" if upper else "0000-01-01 00:00:00"
+    return s + tmpl[len(s):]
+
+def _line_ts(line: str) -> Optional[str]:
+    return norm_ts(LogRecord(line).ts)
+
+def read_time_range(path: Path, since: Optional[str], until: Optional[str], n: int):
+    """Lines with since <= ts <= until, found by binary search on byte offsets.
+
+    Lines are in time order, so I/O is bounded by the window, not by its
+    distance from the end of the file. Returns (lines, truncated) with at
+    most n lines, or None if the file is missing.
+    """
+    lo_ts, hi_ts = norm_ts(since), norm_ts(until, upper=True)
+    out: List[str] = []
+    if str(path).endswith('.gz'):
+        return _read_time_range_gz(path, lo_ts, hi_ts, n)
+    if str(path).endswith(ARC_SUFFIX):
+        from .archive import arc_time_range
+        try:
+            return arc_time_range(path, lo_ts, hi_ts, n)
+        except FileNotFoundError:
+            return None
+    try:
+        with mapped(path) as mm:
+            start = bisect_lines(mm, _line_ts, lo_ts) if lo_ts else 0
+            it = iter_lines(mm, start)
+            try:
+                for mv in it:
+                    line = decode(mv)
+                    mv.release()
+                    if hi_ts:
+                        ts = _line_ts(line)
+                        if ts is not None and ts > hi_ts:
+                            return out, False
+                    if len(out) >= n:
+                        return out, True
+                    out.append(line)
+            finally:
+                it.close()
+    except FileNotFoundError:
+        return None
+    return out, False
+
+def _read_time_range_gz(path: Path, lo_ts: Optional[str], hi_ts: Optional[str], n: int):
+    # archives cannot be bisected cheaply; stream from the start instead
+    from .gzindex import iter_gz_lines
+    out: List[str] = []
+    started = not lo_ts
+    try:
+        for raw in iter_gz_lines(path):
+            line = raw.decode("utf-8", "ignore")
+            ts = _line_ts(line)
+            if not started:
+                if ts is None or ts < lo_ts:
+                    continue
+                started = True
+            if ts is not None and hi_ts and ts > hi_ts:
+                break
+            if len(out) >= n:
+                return out, True
+            out.append(line)
+    except FileNotFoundError:
+        return None
+    return out, False
+
+# ---------- Incremental tail cache ----------
+# Auto-refresh re-requests the same file every few seconds; keep the last
+# lines per path and only read what was appended since the previous call.
+TAIL_CACHE_MAX = 16
+# growth past this many bytes per cached line is re-read from the end
+# (tail_offset) rather than read whole into memory by _tail_extend
+TAIL_EXTEND_LINE_BYTES = 512
+
+class _TailState:
+    __slots__ = ("ino", "size", "ring", "partial")
+
+    def __init__(self, ino: int, size: int, n: int):
+        self.ino = ino
+        self.size = size
+        self.ring = collections.deque(maxlen=n)
+        self.partial = b""  # trailing bytes without a newline yet
 
+_TAIL_CACHE: "collections.OrderedDict[str, _TailState]" = collections.OrderedDict()
+_TAIL_LOCK = threading.Lock()
+
+def _tail_load(path: Path, ino: int, size: int, n: int) -> _TailState:
+    st = _TailState(ino, size, n)
+    with mapped(path, size) as mm:
+        end = size
+        if size and mm[size - 1:size] != b"\n":
+            end = mm.rfind(b"\n") + 1
+            st.partial = mm[end:size]
+        for mv in iter_lines(mm, tail_offset(mm, n, end), end):
+            st.ring.append(decode(mv))
+            mv.release()
+    return st
+
+def _tail_extend(f, st: _TailState, size: int) -> None:
+    f.seek(st.size)
+    data = st.partial + f.read(size - st.size)
+    st.size = size
+    complete, sep, st.partial = data.rpartition(b"\n")
+    if sep:
+        st.ring.extend(l.decode("utf-8", "ignore") for l in (complete + sep).splitlines())
+
+def tail_file_cached(path: Path, n: int) -> Optional[List[str]]:
+    """Like tail_file(), but reuse the previous result for path and read only appended bytes.
+
+    The cached ring buffer is dropped and rebuilt when the inode changes
+    (rotation), the file shrinks (truncation), more lines are requested or
+    the file grew by more than TAIL_EXTEND_LINE_BYTES per cached line.
+    """
+    if is_archive(path):
+        return tail_file(path, n)
+    key = str(path)
+    try:
         with path.open("rb") as f:
-            f.seek(0, 2)
-            size = f.tell()
-            block = 8192
-            buf = b""
-            pos = size
-            lines = []
-            while pos > 0 and len(lines) <= n:
-                rd = min(block, pos)
-                pos -= rd
-                f.seek(pos)
-                buf = f.read(rd) + buf
-                lines = buf.splitlines()
-            out = [l.decode("utf-8", "ignore") for l in lines[-n:]]
-            return out
+            fst = os.fstat(f.fileno())
+            ino, size = fst.st_ino, fst.st_size
+            with _TAIL_LOCK:
+                st = _TAIL_CACHE.get(key)
+                if (st is None or st.ino != ino or size < st.size or n > st.ring.maxlen
+                        or size - st.size > st.ring.maxlen * TAIL_EXTEND_LINE_BYTES):
+                    st = _tail_load(path, ino, size, max(n, st.ring.maxlen if st else 0))
+                elif size > st.size:
+                    _tail_extend(f, st, size)
+                _TAIL_CACHE[key] = st
+                _TAIL_CACHE.move_to_end(key)
+                while len(_TAIL_CACHE) > TAIL_CACHE_MAX:
+                    _TAIL_CACHE.popitem(last=False)
+                out = list(st.ring)
+                if st.partial:
+                    out.append(st.partial.decode("utf-8", "ignore"))
     except FileNotFoundError:
+        with _TAIL_LOCK:
+            _TAIL_CACHE.pop(key, None)
         return None
+    return out[-n:]
+
+def tail_cache_offset(path: Path) -> Optional[Tuple[int, int]]:
+    """(inode, offset just past the last complete line) of the cached tail of path, if cached.
+
+    Live followers start here so a line that was still partial when the
+    page rendered is delivered again once it is complete.
+    """
+    with _TAIL_LOCK:
+        st = _TAIL_CACHE.get(str(path))
+        return (st.ino, st.size - len(st.partial)) if st else None
 
 def parse_kv(line: str) -> dict:
     d = dict(KV.findall(line))
@@ -73,82 +315,85 @@ def parse_kv(line: str) -> dict:
     d["ts"] = ts
     return d
 
+# ---------- Parsed records ----------
+_REC_FIELDS = frozenset(("src_ip", "dst_ip", "sport", "dport", "action", "ts"))
+_REC_ALIASES = {"ip": "src_ip"}
+
+def _port(v: Optional[str]) -> Optional[int]:
+    return int(v) if v and v.isdigit() else None
+
+class LogRecord:
+    """One log line plus its normalized fields, parsed lazily on first access.
+
+    Build one per line and hand the same object to filtering, detection,
+    summaries and rendering so KV.findall runs at most once per line.
+    Ports are ints (or None); get() mirrors parse_kv() with string values.
+    app_label is the display label (log/msg/app_name); get("app") is the raw app= value.
+    """
+    __slots__ = ("raw", "src_ip", "dst_ip", "sport", "dport", "action", "ts", "app_label")
+
+    def __init__(self, raw: str):
+        self.raw = raw
+
+    def __getattr__(self, name):
+        # only reached for field slots that have not been filled yet
+        if name not in _REC_FIELDS and name != "app_label":
+            raise AttributeError(name)
+        self._parse()
+        return object.__getattribute__(self, name)
+
+    def _parse(self) -> None:
+        d = dict(KV.findall(self.raw))
+        self.src_ip = d.get("src") or d.get("src_ip") or d.get("saddr")
+        self.dst_ip = d.get("dst") or d.get("dst_ip") or d.get("daddr")
+        self.dport  = _port(d.get("dport") or d.get("dst_port") or d.get("dpt"))
+        self.sport  = _port(d.get("sport") or d.get("src_port") or d.get("spt"))
+        self.action = d.get("action") or d.get("msg") or d.get("log")
+        self.app_label = d.get("log") or d.get("msg") or d.get("app_name") or ""
+        ts = d.get("ts") or None
+        if not ts:
+            date, time_ = d.get("date"), d.get("time")
+            if date and time_:
+                ts = f"{date} {time_}"
+        self.ts = ts
+
+    def get(self, key: str, default=None):
+        """dict-style lookup with parse_kv() semantics (string values)."""
+        key = _REC_ALIASES.get(key, key)
+        if key in _REC_FIELDS:
+            v = getattr(self, key)
+            if isinstance(v, int):
+                return str(v)
+            return v if v is not None else default
+        return dict(KV.findall(self.raw)).get(key, default)
+
+    @property
+    def kv(self) -> dict:
+        return parse_kv(self.raw)
+
+    def __repr__(self):
+        return f"LogRecord({self.raw!r})"
+
+def as_record(line) -> LogRecord:
+    return line if isinstance(line, LogRecord) else LogRecord(line)
+
+def as_records(lines) -> List[LogRecord]:
+    return [as_record(l) for l in lines]
+
+def raw_line(line) -> str:
+    return line.raw if isinstance(line, LogRecord) else line
+
 def summarize(lines: List[str]) -> Tuple[List[Tuple[str,int]], List[Tuple[str,int]]]:
-    ips, ports = collections.Counter(), collections.Counter()
-    for ln in lines:
-        m = RE_IP.search(ln)
-        if m and m.group(1).startswith("192.168."):
-            ips[m.group(1)] += 1
-        m = RE_DPORT.search(ln)
-        if m:
-            ports[m.group(1)] += 1
-    return ips.most_common(10), ports.most_common(10)
+    """Top 10 internal source IPs and dst ports (see analytics.TopTalkers)."""
+    from .analytics import analyze
+    return analyze(lines, ("summary",))["summary"]
 
 def apply_filters(lines: List[str], regex, q_raw: str):
-    """Advanced filters supporting regex, negatives, kv and ranges."""
-    terms = [t for t in re.split(r'[| ]+', (q_raw or '').strip()) if t]
-    rx_pos_terms = [t for t in terms if ('=' not in t) and not t.startswith('-')]
-    rx_neg_terms = [t[1:] for t in terms if t.startswith('-') and ('=' not in t)]
-    kv_pos, kv_neg, range_pos = [], [], []
-    for t in terms:
-        if '=' in t:
-            if '!=' in t:
-                k, v = t.split('!=', 1)
-                kv_neg.append((k, v))
-            else:
-                k, v = t.split('=', 1)
-                if re.fullmatch(r'\d+-\d+', v) and k in {"dport", "sport"}:
-                    lo, hi = v.split('-', 1)
-                    try:
-                        range_pos.append((k, int(lo), int(hi)))
-                    except ValueError:
-                        pass
-                else:
-                    kv_pos.append((k, v))
-
-    rx_pos = None
-    rx_neg = None
-    if rx_pos_terms:
-        try:
-            rx_pos = re.compile("|".join(rx_pos_terms), re.I)
-        except re.error:
-            rx_pos = None
-    if rx_neg_terms:
-        try:
-            rx_neg = re.compile("|".join(rx_neg_terms), re.I)
-        except re.error:
-            rx_neg = None
-
-    def keep(line: str) -> bool:
-        if rx_neg and rx_neg.search(line):
-            return False
-        need_struct = bool(kv_pos or range_pos or kv_neg)
-        kv = None
-        if need_struct:
-            kv = parse_kv(line)
-            for k, v in kv_neg:
-                if kv.get(k) == v:
-                    return False
-        ranges_ok = True
-        if range_pos:
-            for k, lo, hi in range_pos:
-                try:
-                    val = int(kv.get(k) or -1)
-                except (TypeError, ValueError):
-                    return False
-                if not (lo <= val <= hi):
-                    return False
-        kv_ok = all(kv.get(k) == v for k, v in kv_pos) if kv_pos else False
-        rx_ok = bool(regex.search(line)) if regex else False
-        if rx_pos is not None:
-            rx_ok = rx_ok or bool(rx_pos.search(line))
-        if regex or rx_pos is not None:
-            if kv_pos or range_pos:
-                return rx_ok or ((not kv_pos or kv_ok) and (not range_pos or ranges_ok))
-            return rx_ok
-        if kv_pos or range_pos:
-            return ((not kv_pos or kv_ok) and (not range_pos or ranges_ok))
-        return True
-
-    return [ln for ln in lines if keep(ln)]
+    """Advanced filters supporting regex, negatives, kv and ranges.
 
+    Accepts raw lines or LogRecords and returns the kept items unchanged.
+    q_raw is compiled once per distinct query (see query.compile_query);
+    regex, if given, is OR'ed with the query's text terms.
+    """
+    from .query import compile_query
+    return compile_query(q_raw or "").filter(lines, regex)
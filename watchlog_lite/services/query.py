@@ -0,0 +1,175 @@
+import re
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+from .logs import as_record, raw_line
+
+# key aliases accepted in k=v / k!=v terms (canonical names are LogRecord fields)
+KEY_ALIASES = {
+    "src": "src_ip", "saddr": "src_ip", "ip": "src_ip",
+    "dst": "dst_ip", "daddr": "dst_ip",
+    "dst_port": "dport", "dpt": "dport",
+    "src_port": "sport", "spt": "sport",
+}  # msg=/log= compare their own raw keys; action= also matches msg/log values
+RANGE_KEYS = {"dport", "sport"}
+# raw line keys that LogRecord folds into each canonical field
+FIELD_KEYS = {
+    "src_ip": ("src", "src_ip", "saddr"),
+    "dst_ip": ("dst", "dst_ip", "daddr"),
+    "dport": ("dport", "dst_port", "dpt"),
+    "sport": ("sport", "src_port", "spt"),
+    "action": ("action", "msg", "log"),
+}
+PLAN_CACHE_SIZE = 256
+
+# a token is matched as a plain substring unless it uses regex syntax beyond '.'
+RE_META = re.compile(r'[\^$*+?{}\[\]\\|()]')
+
+def _split_terms(q: str) -> List[str]:
+    return [t for t in re.split(r'[| ]+', (q or '').strip()) if t]
+
+def _kv_match(rec, k: str, v: str) -> bool:
+    val = rec.get(k)
+    if val is None:
+        return False
+    # trailing dot = prefix match, e.g. dst_ip=224. or ip=192.168.
+    return val.startswith(v) if v.endswith('.') else val == v
+
+def _rx(terms: List[str]) -> Optional["re.Pattern"]:
+    if not terms:
+        return None
+    try:
+        return re.compile("|".join(terms), re.I)
+    except re.error:
+        return re.compile("|".join(re.escape(t) for t in terms), re.I)
+
+def _required_literals(pos_text: List[str], pos_kv, pos_ranges):
+    """Substrings of which every line kept by the positive terms contains one.
+
+    Returns [(literal, ignore_case), ...] or None when some positive
+    alternative (a regex token, or range-only kv terms) has no literal.
+    """
+    lits = []
+    for t in pos_text:
+        if RE_META.search(t) or not t.isascii():
+            return None
+        lits.append((t, True))
+    if pos_kv:
+        # all kv terms must hold; one of them is enough to prefilter on
+        k, v = max(pos_kv, key=lambda kv: len(kv[1]))
+        lits.extend((f"{key}={v}", False) for key in FIELD_KEYS.get(k, (k,)))
+    elif pos_ranges:
+        return None
+    return lits or None
+
+def _literal_rx(lits, as_bytes: bool):
+    parts = []
+    for lit, icase in lits:
+        p = re.escape(lit)
+        parts.append(f"(?i:{p})" if icase else p)
+    pat = "|".join(parts)
+    return re.compile(pat.encode() if as_bytes else pat)
+
+class QueryPlan:
+    """A filter query compiled into ordered predicate stages.
+
+    A literal prefilter (see _required_literals) rejects most lines of a
+    selective query up front; the byte form lets readers skip decoding.
+    Negatives run first (substring, then kv, then regex) and exclude the line,
+    and so does a failed range term (ranges must hold on every kept line).
+    Positives keep the line if any text term matches or all kv terms match;
+    cheap substring checks run before kv lookups, regex runs last.
+    """
+    __slots__ = ("query", "neg_lits", "neg_kv", "neg_rx", "pos_lits", "pos_kv",
+                 "pos_ranges", "pos_rx", "highlight", "has_pos", "prefilter", "prefilter_b")
+
+    def __init__(self, query: str):
+        self.query = query
+        neg_text, pos_text = [], []
+        self.neg_kv: List[Tuple[str, str]] = []
+        self.pos_kv: List[Tuple[str, str]] = []
+        self.pos_ranges: List[Tuple[str, int, int]] = []
+        for t in _split_terms(query):
+            neg = t.startswith('-')
+            body = t[1:] if neg else t
+            if '=' not in body:
+                if body:
+                    (neg_text if neg else pos_text).append(body)
+                continue
+            if '!=' in body:
+                k, v = body.split('!=', 1)
+                neg = not neg
+            else:
+                k, v = body.split('=', 1)
+            k = KEY_ALIASES.get(k, k)
+            if not neg and k in RANGE_KEYS and re.fullmatch(r'\d+-\d+', v):
+                lo, hi = v.split('-', 1)
+                self.pos_ranges.append((k, int(lo), int(hi)))
+            else:
+                (self.neg_kv if neg else self.pos_kv).append((k, v))
+        self.neg_lits = [t.lower() for t in neg_text if not RE_META.search(t)]
+        self.neg_rx = _rx([t for t in neg_text if RE_META.search(t)])
+        self.pos_lits = [t.lower() for t in pos_text if not RE_META.search(t)]
+        self.pos_rx = _rx([t for t in pos_text if RE_META.search(t)])
+        # plain tokens match literally ('.' included), so highlight them the same way
+        self.highlight = _rx([t if RE_META.search(t) else re.escape(t) for t in pos_text])
+        self.has_pos = bool(pos_text or self.pos_kv or self.pos_ranges)
+        # literal prefilter: a line without any of these cannot be kept
+        lits = _required_literals(pos_text, self.pos_kv, self.pos_ranges)
+        self.prefilter = _literal_rx(lits, False) if lits else None
+        self.prefilter_b = _literal_rx(lits, True) if lits else None
+
+    def match(self, item, extra=None) -> bool:
+        """True if item (str or LogRecord) passes; extra is an optional OR'ed regex."""
+        line = raw_line(item)
+        if extra is None and self.prefilter is not None and not self.prefilter.search(line):
+            return False
+        low = None
+        if self.neg_lits:
+            low = line.lower()
+            for lit in self.neg_lits:
+                if lit in low:
+                    return False
+        rec = None
+        if self.neg_kv:
+            rec = as_record(item)
+            for k, v in self.neg_kv:
+                if _kv_match(rec, k, v):
+                    return False
+        if self.neg_rx is not None and self.neg_rx.search(line):
+            return False
+        if self.pos_ranges:
+            if rec is None:
+                rec = as_record(item)
+            for k, lo, hi in self.pos_ranges:
+                val = getattr(rec, k)
+                if val is None or not lo <= val <= hi:
+                    return False
+        if not self.has_pos and extra is None:
+            return True
+        if self.pos_lits:
+            if low is None:
+                low = line.lower()
+            for lit in self.pos_lits:
+                if lit in low:
+                    return True
+        if self.pos_kv or self.pos_ranges:
+            if rec is None:
+                rec = as_record(item)
+            if all(_kv_match(rec, k, v) for k, v in self.pos_kv):
+                return True
+        if self.pos_rx is not None and self.pos_rx.search(line):
+            return True
+        return extra is not None and bool(extra.search(line))
+
+    def filter(self, lines: Iterable, extra=None) -> list:
+        if not self.has_pos and extra is None and not (self.neg_lits or self.neg_kv or self.neg_rx):
+            return list(lines)
+        return [ln for ln in lines if self.match(ln, extra)]
+
+    def __repr__(self):
+        return f"QueryPlan({self.query!r})"
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def compile_query(q: str) -> QueryPlan:
+    """Compile q once; repeated refreshes and saved filters hit the LRU."""
+    return QueryPlan((q or "").strip())
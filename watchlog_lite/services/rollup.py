@@ -0,0 +1,389 @@
+import os, struct, threading
+from array import array
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from .logs import sidecar_path, norm_ts, is_archive
+from .analytics import Analyzer, Engine, register
+from .detect import RISKY_PORTS
+from .tail import mapped, iter_lines, decode
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: a single indexer process is assumed
+    fcntl = None
+
+# Per-minute rollups of one month's log, stored as <log>.rollup: a sequence of
+# append-only segments, each covering the complete lines in [start, end) of
+# the log (inode-checked) with its own string table and (minute, key, count)
+# triples for actions, src_ips, dports, allowed risky dports and BT hits.
+# Minutes count from the start of the month. Readers sum the segments;
+# update_rollup() appends one segment per ROLLUP_CHUNK bytes of new log and
+# compacts the file once it holds MAX_SEGMENTS.
+SUFFIX = ".rollup"
+MAGIC = b"WLRU1\0\0\0"
+SEG = struct.Struct("<8sQQQIIIIII")  # magic, inode, start, end, strings bytes, bt, action, ip, port, risky
+MONTH_MINUTES = 31 * 1440
+MAX_SEGMENTS = 64
+ROLLUP_CHUNK = int(os.environ.get("WG_ROLLUP_CHUNK", str(64 << 20)))
+CACHE_MAX = int(os.environ.get("WG_ROLLUP_CACHE", "8"))  # in-memory Rollups (host-months)
+
+@register("rollup")
+class MinuteRollup(Analyzer):
+    """Per-minute counters keyed by the "YYYY-MM-DD HH:MM" prefix of each line's timestamp."""
+    default = False
+    __slots__ = ("bt", "actions", "ips", "ports", "risky")
+
+    def __init__(self):
+        self.bt, self.actions, self.ips, self.ports, self.risky = (Counter() for _ in range(5))
+
+    def feed(self, rec, bt):
+        ts = rec.ts
+        if not ts:
+            return
+        if ts[10:11] != " ":
+            ts = norm_ts(ts)
+        m = ts[:16]
+        act = rec.action or ""
+        self.actions[(m, act)] += 1
+        if bt:
+            self.bt[m] += 1
+        if rec.src_ip:
+            self.ips[(m, rec.src_ip)] += 1
+        dpt = rec.dport
+        if dpt is not None:
+            self.ports[(m, dpt)] += 1
+            if dpt in RISKY_PORTS and act.lower() == "allow":
+                self.risky[(m, dpt)] += 1
+
+    def result(self):
+        return self
+
+def _minute(key: str, ym: str) -> int:
+    """Minute of the month for "YYYY-MM-DD HH:MM", or -1 if it is outside ym (or malformed)."""
+    if key[:7] != ym:
+        return -1
+    try:
+        return (int(key[8:10]) - 1) * 1440 + int(key[11:13]) * 60 + int(key[14:16])
+    except ValueError:
+        return -1
+
+def _encode(ino: int, start: int, end: int, tables, strings: List[str]) -> bytes:
+    """One segment: header, string table, then the five tables as flat uint32 arrays."""
+    blob = "\n".join(strings).encode()
+    body = [array("I", t) for t in tables]
+    head = SEG.pack(MAGIC, ino, start, end, len(blob), *(len(b) for b in body))
+    return head + blob + b"".join(b.tobytes() for b in body)
+
+def _segment(roll: MinuteRollup, ym: str, ino: int, start: int, end: int) -> bytes:
+    sid: Dict[str, int] = {}
+
+    def intern(s: str) -> int:
+        i = sid.get(s)
+        if i is None:
+            i = sid[s] = len(sid)
+        return i
+
+    bt, act, ips, ports, risky = array("I"), array("I"), array("I"), array("I"), array("I")
+    for m, c in roll.bt.items():
+        mi = _minute(m, ym)
+        if mi >= 0:
+            bt.extend((mi, c))
+    for table, out, keyed in ((roll.actions, act, True), (roll.ips, ips, True),
+                              (roll.ports, ports, False), (roll.risky, risky, False)):
+        for (m, k), c in table.items():
+            mi = _minute(m, ym)
+            if mi >= 0:
+                out.extend((mi, intern(k) if keyed else k, c))
+    return _encode(ino, start, end, (bt, act, ips, ports, risky), list(sid))
+
+class Rollup:
+    """All segments of a .rollup file summed in memory: per-minute totals plus per-key rows."""
+    __slots__ = ("path", "ino", "end", "segments", "file_ino", "read_pos", "strings", "sids",
+                 "total", "allow", "deny", "bt", "actions", "ips", "ports", "risky", "memo")
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.ino = 0              # inode of the log the segments describe
+        self.end = 0              # log bytes covered
+        self.segments = 0
+        self.file_ino = 0         # inode of the .rollup file (changes on compaction)
+        self.read_pos = 0
+        self.strings: List[str] = []
+        self.sids: Dict[str, int] = {}
+        self.total = array("I", bytes(4 * MONTH_MINUTES))
+        self.allow = array("I", bytes(4 * MONTH_MINUTES))
+        self.deny = array("I", bytes(4 * MONTH_MINUTES))
+        self.bt = array("I", bytes(4 * MONTH_MINUTES))
+        self.actions = Counter()            # action -> lines
+        self.ips = (array("I"), array("I"), array("I"))     # minute, sid, count
+        self.ports = (array("I"), array("I"), array("I"))   # minute, dport, count
+        self.risky = (array("I"), array("I"), array("I"))   # minute, dport, count
+        self.memo: Dict[Tuple, Dict] = {}   # summary() results, reset when segments are added
+
+    def _sid(self, s: str) -> int:
+        i = self.sids.get(s)
+        if i is None:
+            i = self.sids[s] = len(self.strings)
+            self.strings.append(s)
+        return i
+
+    def apply(self, data: bytes, pos: int = 0) -> int:
+        """Add the complete, contiguous segments in data[pos:]; returns the offset after them."""
+        while len(data) - pos >= SEG.size:
+            magic, ino, start, end, nstr, *counts = SEG.unpack_from(data, pos)
+            size = SEG.size + nstr + 4 * sum(counts)
+            if magic != MAGIC or len(data) - pos < size:
+                break  # torn write at the tail: picked up once complete
+            if (self.segments and (ino != self.ino or start != self.end)) or (not self.segments and start):
+                pos += size  # a duplicate from a concurrent writer; skip
+                continue
+            p = pos + SEG.size
+            local = [self._sid(s) for s in data[p:p + nstr].decode().split("\n")] if nstr else []
+            p += nstr
+            tables = []
+            for n in counts:
+                a = array("I")
+                a.frombytes(data[p:p + 4 * n])
+                tables.append(a)
+                p += 4 * n
+            bt, act, ips, ports, risky = tables
+            for mi, c in zip(bt[0::2], bt[1::2]):
+                self.bt[mi] += c
+            for mi, s, c in zip(act[0::3], act[1::3], act[2::3]):
+                name = self.strings[local[s]]
+                self.actions[name] += c
+                self.total[mi] += c
+                low = name.lower()
+                if low == "allow":
+                    self.allow[mi] += c
+                elif low == "deny":
+                    self.deny[mi] += c
+            for dst, src, mapped_ids in ((self.ips, ips, True), (self.ports, ports, False), (self.risky, risky, False)):
+                dst[0].extend(src[0::3])
+                dst[1].extend(array("I", (local[s] for s in src[1::3])) if mapped_ids else src[1::3])
+                dst[2].extend(src[2::3])
+            self.ino, self.end = ino, end
+            self.segments += 1
+            self.memo.clear()
+            pos += size
+        return pos
+
+    def top(self, rows, k: int = 10, lo: int = 0, hi: int = MONTH_MINUTES, key=None) -> List[Tuple]:
+        """Top k (key, count) of ips/ports/risky rows for minutes in [lo, hi)."""
+        counts = Counter()
+        whole = lo <= 0 and hi >= MONTH_MINUTES
+        for mi, x, c in zip(*rows):
+            if whole or lo <= mi < hi:
+                counts[x] += c
+        if rows is self.ips:
+            names = ((self.strings[x], c) for x, c in counts.items())
+            if key is not None:
+                names = ((s, c) for s, c in names if key(s))
+            counts = Counter(dict(names))
+        return counts.most_common(k)
+
+    def summary(self, lo: int = 0, hi: int = MONTH_MINUTES, k: int = 10) -> Dict:
+        """Totals and top internal IPs / dst ports / allowed risky ports for minutes [lo, hi)."""
+        hit = self.memo.get((lo, hi, k))
+        if hit is not None:
+            return hit
+        out = self.memo[(lo, hi, k)] = {
+            "lines": sum(self.total[lo:hi]),
+            "allow": sum(self.allow[lo:hi]),
+            "deny": sum(self.deny[lo:hi]),
+            "bt": sum(self.bt[lo:hi]),
+            "top_ips": self.top(self.ips, k, lo, hi, key=lambda s: s.startswith("192.168.")),
+            "top_ports": self.top(self.ports, k, lo, hi),
+            "risky_ports": self.top(self.risky, k, lo, hi),
+        }
+        return out
+
+    def series(self, lo: int = 0, hi: int = MONTH_MINUTES, step: int = 60):
+        """[(first minute, total, deny, bt), ...] summed over buckets of step minutes."""
+        out = []
+        for b in range(lo, hi, step):
+            e = min(b + step, hi)
+            out.append((b, sum(self.total[b:e]), sum(self.deny[b:e]), sum(self.bt[b:e])))
+        return out
+
+    def to_segment(self) -> bytes:
+        """Everything summed into a single segment (compaction)."""
+        bt = array("I")
+        for mi, c in enumerate(self.bt):
+            if c:
+                bt.extend((mi, c))
+        act = array("I")
+        # per-minute actions are only kept as allow / deny / other totals
+        for mi in range(MONTH_MINUTES):
+            t, a, d = self.total[mi], self.allow[mi], self.deny[mi]
+            for sid, c in ((self._sid("Allow"), a), (self._sid("Deny"), d), (self._sid(""), t - a - d)):
+                if c:
+                    act.extend((mi, sid, c))
+        tables = [bt, act]
+        for rows in (self.ips, self.ports, self.risky):
+            merged = Counter()
+            for mi, x, c in zip(*rows):
+                merged[(mi, x)] += c
+            flat = array("I")
+            for (mi, x), c in merged.items():
+                flat.extend((mi, x, c))
+            tables.append(flat)
+        return _encode(self.ino, 0, self.end, tables, self.strings)
+
+_CACHE: "OrderedDict[str, Rollup]" = OrderedDict()
+_LOCK = threading.Lock()  # guards _CACHE and _PATH_LOCKS only
+_PATH_LOCKS: Dict[str, threading.Lock] = {}
+
+def _path_lock(path: Path) -> threading.Lock:
+    """Serializes reading and indexing of one log; other logs are not blocked."""
+    with _LOCK:
+        return _PATH_LOCKS.setdefault(str(path), threading.Lock())
+
+def _keep(key: str, roll: Rollup) -> None:
+    with _LOCK:
+        _CACHE[key] = roll
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > CACHE_MAX:
+            _CACHE.popitem(last=False)
+
+def _refresh(path: Path, rfile: Path) -> Rollup:
+    """Cached Rollup for path with any segments appended to rfile since the last read.
+
+    The caller holds _path_lock(path).
+    """
+    key = str(path)
+    with _LOCK:
+        roll = _CACHE.get(key)
+    try:
+        st = os.stat(rfile)
+    except FileNotFoundError:
+        roll = Rollup(path)
+        _keep(key, roll)
+        return roll
+    if roll is None or roll.file_ino != st.st_ino or st.st_size < roll.read_pos:
+        roll = Rollup(path)
+        roll.file_ino = st.st_ino
+    if st.st_size > roll.read_pos:
+        with open(rfile, "rb") as f:
+            f.seek(roll.read_pos)
+            data = f.read()
+        roll.read_pos += roll.apply(data)
+    _keep(key, roll)
+    return roll
+
+def load_rollup(path: Path) -> Optional[Rollup]:
+    """Rollup of a log from its sidecar (without indexing anything new), or None if there is none."""
+    with _path_lock(path):
+        roll = _refresh(path, sidecar_path(path, SUFFIX))
+    return roll if roll.segments else None
+
+def _new_lines(path: Path, start: int, limit: int):
+    """(lines, end): complete lines of path from start, stopping after about limit bytes."""
+    if is_archive(path):
+        from .archive import iter_archive
+        out, pos, partial = [], start, b""
+        for chunk in iter_archive(path, start):
+            parts = (partial + chunk).split(b"\n")
+            partial = parts.pop()
+            for raw in parts:
+                out.append(decode(raw).rstrip("\r"))
+                pos += len(raw) + 1
+            if pos - start >= limit:
+                return out, pos
+        if partial:  # an archive's last line may lack its newline
+            out.append(decode(partial).rstrip("\r"))
+            pos += len(partial)
+        return out, pos
+    out = []
+    with mapped(path) as mm:
+        stop = mm.rfind(b"\n", start, min(len(mm), start + limit)) + 1
+        if stop <= start:
+            stop = mm.find(b"\n", start) + 1  # one line longer than limit
+        if stop <= start:
+            return out, start
+        it = iter_lines(mm, start, stop - 1)
+        try:
+            for mv in it:
+                out.append(decode(mv))
+                mv.release()
+        finally:
+            it.close()
+    return out, stop
+
+@contextmanager
+def _locked(rfile: Path):
+    """The sidecar opened for appending under an exclusive lock (re-opened if it was replaced meanwhile)."""
+    while True:
+        f = open(rfile, "ab")
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            if os.fstat(f.fileno()).st_ino == os.stat(rfile).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        f.close()
+    try:
+        yield f
+    finally:
+        f.close()
+
+def update_rollup(path: Path, max_bytes: Optional[int] = None) -> Optional[Rollup]:
+    """Index lines appended to path since its rollup was last written (at most ~max_bytes).
+
+    Writers hold an exclusive lock on the sidecar, so the web app and the
+    background indexer can both call this. A rotated or truncated log
+    starts a fresh rollup. Returns the up-to-date Rollup, or None if the
+    log is missing.
+    """
+    path = Path(path)
+    ym = path.parent.name
+    rfile = sidecar_path(path, SUFFIX)
+    with _path_lock(path), _locked(rfile) as f:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        roll = _refresh(path, rfile)
+        gz = is_archive(path)
+        if roll.segments and (roll.ino != st.st_ino or (not gz and st.st_size < roll.end)):
+            f.truncate(0)  # rotated or truncated: start over
+            roll = _refresh(path, rfile)
+        budget = max_bytes
+        while True:
+            limit = ROLLUP_CHUNK if budget is None else min(ROLLUP_CHUNK, budget)
+            if limit <= 0:
+                break
+            lines, end = _new_lines(path, roll.end, limit)
+            if end <= roll.end:
+                break
+            seg = _segment(Engine(("rollup",)).feed(lines).analyzers["rollup"], ym, st.st_ino, roll.end, end)
+            f.write(seg)
+            f.flush()
+            if budget is not None:
+                budget -= end - roll.end
+            roll = _refresh(path, rfile)
+            if roll.end != end:
+                break  # sidecar replaced under us; the next call starts over
+        if roll.segments > MAX_SEGMENTS:
+            tmp = rfile.with_name(rfile.name + f".{os.getpid()}.tmp")
+            tmp.write_bytes(roll.to_segment())
+            os.replace(tmp, rfile)
+            with _LOCK:
+                _CACHE.pop(str(path), None)
+            roll = _refresh(path, rfile)
+        return roll
+
+def forget_rollup(path: Path) -> None:
+    """Drop the in-memory Rollup of path (e.g. a finished month) from the cache."""
+    with _LOCK:
+        _CACHE.pop(str(path), None)
+
+def minute_range(ym: str, day: Optional[str] = None) -> Tuple[int, int]:
+    """[lo, hi) minutes of the month for day ("YYYY-MM-DD" within ym), else the whole month."""
+    if day and day[:8] == ym + "-" and day[8:10].isdigit() and 1 <= int(day[8:10]) <= 31:
+        lo = (int(day[8:10]) - 1) * 1440
+        return lo, lo + 1440
+    return 0, MONTH_MINUTES
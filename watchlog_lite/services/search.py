@@ -0,0 +1,169 @@
+import os, threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+from .gzindex import get_gz_index, iter_gz_lines
+from .logs import ARC_SUFFIX
+from .query import compile_query
+from .tail import mapped, scan_range, split_ranges
+
+# Full-file search: newline-aligned byte ranges filtered in a process pool,
+# results yielded in file order as soon as the next range is done.
+SEARCH_WORKERS = int(os.environ.get("WG_SEARCH_WORKERS", "0")) or (os.cpu_count() or 1)
+SEARCH_CHUNK = int(os.environ.get("WG_SEARCH_CHUNK", str(32 * 1024 * 1024)))
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+def _pool() -> ProcessPoolExecutor:
+    # never fork: the caller is a threaded server worker and a forked child
+    # could inherit a lock some other thread was holding at that moment
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            import multiprocessing
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _POOL = ProcessPoolExecutor(max_workers=SEARCH_WORKERS,
+                                        mp_context=multiprocessing.get_context(method))
+        return _POOL
+
+def _search_range(path: str, start: int, end: int, q: str) -> List[str]:
+    plan = compile_query(q)
+    with mapped(Path(path), end) as mm:
+        return scan_range(mm, start, end, plan.match, plan.prefilter_b)
+
+def _search_gz_range(path: str, uoff: int, end: Optional[int], q: str, batch: int = 0) -> Iterator[List[str]]:
+    plan = compile_query(q)
+    out: List[str] = []
+    for raw in iter_gz_lines(Path(path), uoff, end):
+        if plan.prefilter_b is not None and not plan.prefilter_b.search(raw):
+            continue
+        line = raw.decode("utf-8", "ignore")
+        if plan.match(line):
+            out.append(line)
+            if batch and len(out) >= batch:
+                yield out
+                out = []
+    yield out
+
+def _search_gz_part(path: str, uoff: int, end: int, q: str) -> List[str]:
+    return next(_search_gz_range(path, uoff, end, q))
+
+def _search_arc_part(path: str, start: int, stop: int, q: str) -> List[str]:
+    from .archive import arc_search
+    return arc_search(Path(path), start, stop, compile_query(q))
+
+def _arc_ranges(path: Path, chunk: int):
+    from .archive import get_archive
+    arc = get_archive(path)
+    return arc.ranges(max(1, arc.usize // chunk))
+
+def search_file(path: Path, q: str, workers: Optional[int] = None,
+                chunk: int = SEARCH_CHUNK) -> Iterator[List[str]]:
+    """Yield batches of lines matching q over the whole file, in file order.
+
+    Raises FileNotFoundError if path is missing. Small files and workers=1
+    are scanned in-process, as are .gz archives without line-aligned members.
+    .arc archives are split at block boundaries and skip blocks by bloom.
+    """
+    workers = workers or SEARCH_WORKERS
+    if str(path).endswith(ARC_SUFFIX):
+        ranges = _arc_ranges(path, chunk)
+        if workers <= 1 or len(ranges) <= 1:
+            for start, stop in ranges:
+                yield _search_arc_part(str(path), start, stop, q)
+            return
+        yield from _run_pool(_search_arc_part, path, ranges, q, workers)
+        return
+    if str(path).endswith(".gz"):
+        # archives split only at line-aligned gzip members (see gzindex)
+        idx = get_gz_index(path)
+        ranges = [(u0, u1) for _, u0, u1 in idx.line_ranges(max(1, idx.usize // chunk))]
+        if workers <= 1 or len(ranges) <= 1:
+            yield from _search_gz_range(str(path), 0, None, q, batch=10000)
+            return
+        yield from _run_pool(_search_gz_part, path, ranges, q, workers)
+        return
+    size = os.stat(path).st_size
+    with mapped(path, size) as mm:
+        ranges = split_ranges(mm, chunk)
+    if workers <= 1 or len(ranges) <= 1:
+        for start, end in ranges:
+            yield _search_range(str(path), start, end, q)
+        return
+    yield from _run_pool(_search_range, path, ranges, q, workers)
+
+def _run_pool(fn, path: Path, ranges, q: str, workers: int) -> Iterator[List[str]]:
+    pool = _pool()
+    pending = iter(ranges)
+    inflight = deque()
+    try:
+        # keep a bounded number of ranges in flight so memory stays flat
+        for start, end in pending:
+            inflight.append(pool.submit(fn, str(path), start, end, q))
+            if len(inflight) >= workers * 2:
+                break
+        while inflight:
+            fut = inflight.popleft()
+            nxt = next(pending, None)
+            if nxt is not None:
+                inflight.append(pool.submit(fn, str(path), nxt[0], nxt[1], q))
+            yield fut.result()
+    finally:
+        for fut in inflight:
+            fut.cancel()
+
+def _analyze_range(path: str, start: int, end: int, q: str, names=None):
+    from .analytics import Engine
+    return Engine(names).feed(_search_range(path, start, end, q))
+
+def _analyze_arc_part(path: str, start: int, stop: int, q: str, names=None):
+    from .analytics import Engine
+    return Engine(names).feed(_search_arc_part(path, start, stop, q))
+
+def _analyze_gz_part(path: str, uoff: int, end: Optional[int], q: str, names=None):
+    from .analytics import Engine
+    eng = Engine(names)
+    for batch in _search_gz_range(path, uoff, end, q, batch=10000):
+        eng.feed(batch)
+    return eng
+
+def analyze_file(path: Path, q: str, names: Optional[Sequence[str]] = None,
+                 workers: Optional[int] = None, chunk: int = SEARCH_CHUNK):
+    """Analytics Engine over every line of path matching q.
+
+    Each range is analyzed where it is read (in the pool, like search_file)
+    and only the fixed-size per-range Engines travel back to be merged.
+    Raises FileNotFoundError if path is missing.
+    """
+    from .analytics import Engine
+    workers = workers or SEARCH_WORKERS
+    names = tuple(names) if names else None
+    total = Engine(names)
+    if str(path).endswith(ARC_SUFFIX):
+        ranges = _arc_ranges(path, chunk)
+        fn = _analyze_arc_part
+        if workers <= 1 or len(ranges) <= 1:
+            for start, stop in ranges:
+                total.merge(fn(str(path), start, stop, q, names))
+            return total
+    elif str(path).endswith(".gz"):
+        idx = get_gz_index(path)
+        ranges = [(u0, u1) for _, u0, u1 in idx.line_ranges(max(1, idx.usize // chunk))]
+        fn = _analyze_gz_part
+        if workers <= 1 or len(ranges) <= 1:
+            return total.merge(fn(str(path), 0, None, q, names))
+    else:
+        size = os.stat(path).st_size
+        with mapped(path, size) as mm:
+            ranges = split_ranges(mm, chunk)
+        fn = _analyze_range
+        if workers <= 1 or len(ranges) <= 1:
+            for start, end in ranges:
+                total.merge(fn(str(path), start, end, q, names))
+            return total
+    for eng in _run_pool(partial(fn, names=names), path, ranges, q, workers):
+        total.merge(eng)
+    return total
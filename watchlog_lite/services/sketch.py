@@ -0,0 +1,138 @@
+import hashlib, heapq, math, os
+from operator import itemgetter
+from typing import Dict, Hashable, List, Tuple
+
+# Fixed-memory, mergeable aggregators for month-wide and live streams.
+# Both are exact on small inputs (a page-sized slice gives the same numbers
+# as a Counter / set) and degrade to bounded-error estimates beyond that.
+SKETCH_CAPACITY = int(os.environ.get("WG_SKETCH_CAPACITY", "2048"))
+HLL_P = 11            # 2048 one-byte registers, ~2.3% standard error
+EXACT_DISTINCT = 64   # DistinctCounter keeps a plain set up to this size
+
+class SpaceSaving:
+    """Heavy hitters in O(capacity) memory (Space-Saving, pruned in batches).
+
+    Counts are exact until more than 2 * capacity distinct items were seen.
+    After that the smallest counters are evicted; a new item starts at
+    floor (the largest evicted count), so every count overestimates its
+    item by at most floor and no item with a true count above floor is
+    missed.
+    """
+    __slots__ = ("capacity", "counts", "floor")
+
+    def __init__(self, capacity: int = SKETCH_CAPACITY):
+        self.capacity = capacity
+        self.counts: Dict[Hashable, int] = {}
+        self.floor = 0
+
+    def add(self, item, c: int = 1) -> None:
+        counts = self.counts
+        v = counts.get(item)
+        if v is None:
+            counts[item] = self.floor + c
+            if len(counts) > 2 * self.capacity:
+                self._prune()
+        else:
+            counts[item] = v + c
+
+    def _prune(self) -> None:
+        ranked = heapq.nlargest(self.capacity + 1, self.counts.items(), key=itemgetter(1))
+        self.floor = max(self.floor, ranked.pop()[1])
+        keep = {item for item, _ in ranked}
+        self.counts = {k: v for k, v in self.counts.items() if k in keep}
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """Fold other in; an item missing on one side is assumed to have that side's floor."""
+        counts = self.counts
+        for item in counts.keys() - other.counts.keys():
+            counts[item] += other.floor
+        for item, c in other.counts.items():
+            v = counts.get(item)
+            counts[item] = (self.floor if v is None else v) + c
+        self.floor += other.floor
+        if len(counts) > 2 * self.capacity:
+            self._prune()
+        return self
+
+    def top(self, n: int = 10) -> List[Tuple[Hashable, int]]:
+        """[(item, count), ...] like Counter.most_common(n)."""
+        return heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+
+    def __len__(self):
+        return len(self.counts)
+
+def _h64(item) -> int:
+    """Stable 64-bit hash (the same in every worker process)."""
+    if isinstance(item, int):
+        z = (item + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF  # splitmix64
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+        return z ^ (z >> 31)
+    return int.from_bytes(hashlib.blake2b(str(item).encode(), digest_size=8).digest(), "little")
+
+class HyperLogLog:
+    """Distinct-count estimate in 2**p bytes; merge() is a register-wise max."""
+    __slots__ = ("p", "reg")
+
+    def __init__(self, p: int = HLL_P):
+        self.p = p
+        self.reg = bytearray(1 << p)
+
+    def add(self, item) -> None:
+        h = _h64(item)
+        idx = h >> (64 - self.p)
+        w = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - w.bit_length() + 1
+        if rank > self.reg[idx]:
+            self.reg[idx] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        self.reg = bytearray(map(max, self.reg, other.reg))
+        return self
+
+    def count(self) -> int:
+        m = len(self.reg)
+        est = (0.7213 / (1 + 1.079 / m)) * m * m / sum(2.0 ** -r for r in self.reg)
+        zeros = self.reg.count(0)
+        if est <= 2.5 * m and zeros:
+            est = m * math.log(m / zeros)  # small-range correction
+        return int(round(est))
+
+class DistinctCounter:
+    """Distinct items: an exact set while small, a HyperLogLog after EXACT_DISTINCT."""
+    __slots__ = ("items", "hll")
+
+    def __init__(self):
+        self.items = set()
+        self.hll = None
+
+    def add(self, item) -> None:
+        if self.hll is not None:
+            self.hll.add(item)
+            return
+        self.items.add(item)
+        if len(self.items) > EXACT_DISTINCT:
+            self._promote()
+
+    def _promote(self) -> None:
+        self.hll = HyperLogLog()
+        for item in self.items:
+            self.hll.add(item)
+        self.items = set()
+
+    def merge(self, other: "DistinctCounter") -> "DistinctCounter":
+        if self.hll is None and other.hll is None:
+            self.items |= other.items
+            if len(self.items) > EXACT_DISTINCT:
+                self._promote()
+            return self
+        if self.hll is None:
+            self._promote()
+        if other.hll is not None:
+            self.hll.merge(other.hll)
+        for item in other.items:
+            self.hll.add(item)
+        return self
+
+    def __len__(self):
+        return self.hll.count() if self.hll is not None else len(self.items)
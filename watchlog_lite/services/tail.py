@@ -0,0 +1,265 @@
+import mmap
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+# Shared tail engine: map the file once, locate the start of the last n lines
+# with rfind and hand out memoryview slices; only the lines that are actually
+# returned get decoded.
+
+@contextmanager
+def mapped(path: Path, size: Optional[int] = None):
+    """Yield a read-only mmap of path (or b"" for an empty file), truncated to size if given."""
+    with Path(path).open("rb") as f:
+        if size is None:
+            f.seek(0, 2)
+            size = f.tell()
+        if size <= 0:
+            yield b""
+            return
+        mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        try:
+            yield mm
+        finally:
+            mm.close()
+
+def tail_offset(buf, n: int, end: Optional[int] = None) -> int:
+    """Byte offset where the last n lines of buf[:end] start."""
+    if end is None:
+        end = len(buf)
+    if n <= 0 or end <= 0:
+        return end
+    pos = end - 1 if buf[end - 1:end] == b"\n" else end
+    for _ in range(n):
+        nl = buf.rfind(b"\n", 0, pos)
+        if nl < 0:
+            return 0
+        pos = nl
+    return pos + 1
+
+def iter_lines(buf, start: int = 0, end: Optional[int] = None) -> Iterator[memoryview]:
+    """Yield each line of buf[start:end] as a memoryview without the newline."""
+    if end is None:
+        end = len(buf)
+    mv = memoryview(buf)
+    try:
+        pos = start
+        while pos < end:
+            nl = buf.find(b"\n", pos, end)
+            if nl < 0:
+                nl = end
+            stop = nl - 1 if nl > pos and buf[nl - 1] == 13 else nl  # drop CR of CRLF
+            yield mv[pos:stop]
+            pos = nl + 1
+    finally:
+        mv.release()
+
+def decode(line) -> str:
+    return str(line, "utf-8", "ignore")
+
+def tail_lines(path: Path, n: int) -> List[str]:
+    """Return the last n lines of path decoded as text."""
+    with mapped(path) as mm:
+        start = tail_offset(mm, n)
+        out = []
+        for mv in iter_lines(mm, start):
+            out.append(decode(mv))
+            mv.release()
+        return out
+
+SCAN_BLOCK = 1 << 20
+
+def _candidate_spans(chunk: bytes, prefilter):
+    """(start, end) of each line in chunk containing a prefilter hit, in order."""
+    spans = []
+    last_end = -1
+    for m in prefilter.finditer(chunk):
+        if m.start() <= last_end:
+            continue  # another hit on a line we already have
+        s = chunk.rfind(b"\n", 0, m.start()) + 1
+        e = chunk.find(b"\n", m.end())
+        if e < 0:
+            e = len(chunk)
+        spans.append((s, e))
+        last_end = e
+    return spans
+
+def scan_matches(path: Path, n: int, match, end: Optional[int] = None,
+                 max_bytes: Optional[int] = None, max_seconds: Optional[float] = None,
+                 prefilter=None):
+    """Walk path backwards from end collecting up to n lines for which match(str) is true.
+
+    Stops early once max_bytes have been scanned or max_seconds have passed.
+    prefilter, a compiled bytes pattern every matching line must contain, is
+    run over whole blocks so only candidate lines get decoded and matched.
+    Returns (lines in file order, cursor, scanned line count); cursor is the
+    offset to pass back as end to continue further up, or None at file start.
+    """
+    deadline = time.monotonic() + max_seconds if max_seconds else None
+    out: List[str] = []
+    scanned = 0
+    with mapped(path) as mm:
+        if end is None or end > len(mm):
+            end = len(mm)
+        floor = end - max_bytes if max_bytes else 0
+        pos = end - 1 if end and mm[end - 1:end] == b"\n" else end
+        start = end
+        if prefilter is not None:
+            while start > 0 and len(out) < n:
+                lo = max(0, pos - SCAN_BLOCK)
+                if lo:
+                    lo = mm.rfind(b"\n", 0, lo) + 1  # align to a line start
+                chunk = mm[lo:pos]
+                start = lo
+                for s, e in reversed(_candidate_spans(chunk, prefilter)):
+                    line = decode(chunk[s:e])
+                    if match(line):
+                        out.append(line.rstrip("\r"))
+                        if len(out) >= n:
+                            start = lo + s
+                            break
+                scanned += chunk.count(b"\n", start - lo) + 1
+                pos = lo - 1
+                if start <= floor or (deadline and time.monotonic() > deadline):
+                    break
+        while start > 0 and len(out) < n and prefilter is None:
+            nl = mm.rfind(b"\n", 0, pos)
+            start = nl + 1
+            line = decode(mm[start:pos])
+            scanned += 1
+            if match(line):
+                out.append(line.rstrip("\r"))
+            pos = nl
+            if start <= floor or (deadline and not scanned & 1023 and time.monotonic() > deadline):
+                break
+    out.reverse()
+    return out, (start or None), scanned
+
+def bisect_lines(buf, key, target, lo: int = 0, hi: Optional[int] = None) -> int:
+    """Start offset of the first line whose key(str) >= target in a key-sorted buffer.
+
+    Probes resynchronise on the next newline; lines where key() is None
+    (no timestamp, garbage) are skipped. Returns len(buf) if none qualifies.
+    """
+    size = len(buf)
+    if hi is None:
+        hi = size
+
+    def next_keyed(p: int, stop: int):
+        while p < stop:
+            e = buf.find(b"\n", p, size)
+            if e < 0:
+                e = size
+            k = key(decode(buf[p:e]))
+            if k is not None:
+                return p, e, k
+            p = e + 1
+        return None
+
+    while hi - lo > 4096:
+        mid = (lo + hi) // 2
+        s = buf.find(b"\n", mid, hi) + 1
+        probe = next_keyed(s, hi) if s else None
+        if probe is None:
+            hi = mid
+        elif probe[2] < target:
+            lo = probe[1] + 1
+        else:
+            hi = mid
+    probe = next_keyed(lo, size)
+    while probe is not None and probe[2] < target:
+        probe = next_keyed(probe[1] + 1, size)
+    return probe[0] if probe else size
+
+def scan_range(buf, start: int, end: int, match, prefilter=None) -> List[str]:
+    """Lines of buf[start:end] (newline-aligned) for which match(str) is true, in order.
+
+    With a bytes prefilter only lines containing a hit are decoded.
+    """
+    out: List[str] = []
+    if prefilter is None:
+        it = iter_lines(buf, start, end)
+        try:
+            for mv in it:
+                line = decode(mv)
+                mv.release()
+                if match(line):
+                    out.append(line)
+        finally:
+            it.close()
+        return out
+    pos = start
+    while pos < end:
+        hi = min(end, pos + SCAN_BLOCK)
+        if hi < end:
+            nl = buf.rfind(b"\n", pos, hi)
+            if nl < 0:
+                nl = buf.find(b"\n", hi, end)
+            hi = nl + 1 if nl >= 0 else end
+        chunk = buf[pos:hi]
+        for s, e in _candidate_spans(chunk, prefilter):
+            line = decode(chunk[s:e]).rstrip("\r")
+            if match(line):
+                out.append(line)
+        pos = hi
+    return out
+
+def split_ranges(buf, chunk: int) -> List[Tuple[int, int]]:
+    """Cut buf into newline-aligned (start, end) ranges of roughly chunk bytes."""
+    size = len(buf)
+    ranges = []
+    start = 0
+    while start < size:
+        cut = buf.find(b"\n", start + chunk) + 1 if start + chunk < size else 0
+        end = cut or size
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+def iter_tail(path: Path, n: int) -> Iterator[str]:
+    """Lazily yield the last n lines of path; the mapping stays open until exhausted or closed."""
+    with mapped(path) as mm:
+        it = iter_lines(mm, tail_offset(mm, n))
+        try:
+            for mv in it:
+                line = decode(mv)
+                mv.release()
+                yield line
+        finally:
+            it.close()
+
+def read_appended(path: Path, pos: int, limit: int = 8 << 20) -> Tuple[List[str], int]:
+    """Complete lines written at or after byte offset pos (at most ~limit bytes) and the offset after them."""
+    with Path(path).open("rb") as f:
+        f.seek(pos)
+        data = f.read(limit)
+    cut = data.rfind(b"\n") + 1
+    if not cut:
+        return [], pos
+    return [decode(l).rstrip("\r") for l in data[:cut - 1].split(b"\n")], pos + cut
+
+def complete_end(path: Path) -> int:
+    """Offset just past the last complete (newline-terminated) line of path."""
+    with mapped(path) as mm:
+        return mm.rfind(b"\n") + 1
+
+def scan_forward(path: Path, start: int, n: int, match, max_bytes: Optional[int] = None):
+    """Up to n complete lines at or after offset start for which match(str) is true.
+
+    Returns (lines, offset just past the last line examined); stops early
+    once max_bytes have been scanned.
+    """
+    out: List[str] = []
+    with mapped(path) as mm:
+        end = mm.rfind(b"\n") + 1
+        pos = start
+        while pos < end and len(out) < n:
+            nl = mm.find(b"\n", pos, end)
+            line = decode(mm[pos:nl]).rstrip("\r")
+            pos = nl + 1
+            if match(line):
+                out.append(line)
+            if max_bytes and pos - start >= max_bytes:
+                break
+    return out, max(pos, start)
@@ -1,56 +1,137 @@
-import html
+import html, ipaddress, os, threading, time
+from array import array
+from functools import lru_cache
 from pathlib import Path
+from .detect import _is_private_ip
+from .columns import ip4
 
 HOSTS_FILE = Path("/opt/watchlog-lite/hosts.yaml")
-_HOST_MAP = None
-_HOST_MAP_MTIME = None
+# hosts.yaml is checked for changes at most every HOSTS_RELOAD seconds;
+# names are memoized per IP (HOST_CACHE_SIZE entries) until it changes.
+HOSTS_RELOAD = float(os.environ.get("WG_HOSTS_RELOAD", "5"))
+HOST_CACHE_SIZE = 65536
 
-def _load_hosts_map():
-    global _HOST_MAP, _HOST_MAP_MTIME
-    try:
-        st = HOSTS_FILE.stat()
-    except FileNotFoundError:
-        _HOST_MAP = {}
-        _HOST_MAP_MTIME = None
-        return _HOST_MAP
-    if _HOST_MAP is not None and _HOST_MAP_MTIME == st.st_mtime:
-        return _HOST_MAP
-    mp = {}
-    try:
-        with HOSTS_FILE.open('r', encoding='utf-8', errors='ignore') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'): continue
-                if ':' in line:
-                    ip, name = line.split(':', 1)
-                    mp[ip.strip()] = name.strip()
-    except Exception:
-        mp = {}
-    _HOST_MAP = mp
-    _HOST_MAP_MTIME = st.st_mtime
-    return _HOST_MAP
+class HostMap:
+    """Names from hosts.yaml lines "ip: name" or "cidr: name"; the longest prefix wins.
+
+    IPv4 entries are compiled into a binary trie over the address bits
+    (flat child arrays, node 0 is the root); anything else is matched as
+    an exact string, as before.
+    """
+    __slots__ = ("exact", "left", "right", "label", "names", "version")
+
+    def __init__(self, version=None):
+        self.exact = {}
+        self.left, self.right, self.label = array("i", [0]), array("i", [0]), array("i", [-1])
+        self.names = []
+        self.version = version
+
+    def add(self, key: str, name: str) -> None:
+        try:
+            net = ipaddress.IPv4Network(key, strict=False)
+        except ValueError:
+            self.exact[key] = name
+            return
+        bits, node = int(net.network_address), 0
+        for i in range(net.prefixlen):
+            side = self.right if (bits >> (31 - i)) & 1 else self.left
+            if not side[node]:
+                side[node] = len(self.label)
+                self.left.append(0)
+                self.right.append(0)
+                self.label.append(-1)
+            node = side[node]
+        self.label[node] = len(self.names)
+        self.names.append(name)
+
+    def lookup(self, ip: str):
+        """Name for ip, or None."""
+        name = self.exact.get(ip)
+        if name is not None:
+            return name
+        v = ip4(ip)
+        if not v and ip != "0.0.0.0":
+            return None
+        left, right, label = self.left, self.right, self.label
+        node, best = 0, label[0]
+        for i in range(31, -1, -1):
+            node = right[node] if (v >> i) & 1 else left[node]
+            if not node:
+                break
+            if label[node] >= 0:
+                best = label[node]
+        return self.names[best] if best >= 0 else None
+
+    @classmethod
+    def load(cls, path: Path, version) -> "HostMap":
+        mp = cls(version)
+        try:
+            with path.open('r', encoding='utf-8', errors='ignore') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line or line.startswith('#'): continue
+                    if ':' in line:
+                        # "key: name" first, so IPv6 keys keep their colons
+                        ip, name = line.split(': ', 1) if ': ' in line else line.split(':', 1)
+                        mp.add(ip.strip(), name.strip())
+        except Exception:
+            mp = cls(version)
+        return mp
+
+_HOSTS = HostMap()
+_HOSTS_CHECKED = None
+_HOSTS_LOCK = threading.Lock()
+
+def _hosts() -> HostMap:
+    """The current HostMap, re-reading hosts.yaml when its mtime/size changed (checked every HOSTS_RELOAD s)."""
+    global _HOSTS, _HOSTS_CHECKED
+    now = time.monotonic()
+    if _HOSTS_CHECKED is not None and now - _HOSTS_CHECKED < HOSTS_RELOAD:
+        return _HOSTS
+    with _HOSTS_LOCK:
+        if _HOSTS_CHECKED is None or now - _HOSTS_CHECKED >= HOSTS_RELOAD:
+            try:
+                st = HOSTS_FILE.stat()
+                version = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                version = None
+            if version != _HOSTS.version:
+                _HOSTS = HostMap.load(HOSTS_FILE, version) if version else HostMap()
+                _host_name.cache_clear()
+            _HOSTS_CHECKED = now
+    return _HOSTS
+
+def hosts_version():
+    """Identifies the loaded hosts.yaml ((mtime_ns, size), or None without one)."""
+    return _hosts().version
+
+@lru_cache(maxsize=HOST_CACHE_SIZE)
+def _host_name(ip: str, hosts: HostMap):
+    return hosts.lookup(ip)
 
 def _map_ip(ip: str) -> str:
     if not ip: return ip
-    mp = _load_hosts_map()
-    if ip in mp:
-        return f"{mp[ip]} ({ip})"
+    name = _host_name(ip, _hosts())
+    if name is not None:
+        return f"{name} ({ip})"
     return ip
 
-def _rel_time(ts: str) -> str:
+@lru_cache(maxsize=HOST_CACHE_SIZE)
+def _parse_ts(s: str):
     from datetime import datetime
-    if not ts:
-        return ""
-    s = ts.strip()
-    dt = None
     try:
         if 'T' in s or 'Z' in s:
             s2 = s.replace('Z', '+00:00')
-            dt = datetime.fromisoformat(s2)
-        else:
-            dt = datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
+            return datetime.fromisoformat(s2)
+        return datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
     except Exception:
-        dt = None
+        return None
+
+def _rel_time(ts: str) -> str:
+    from datetime import datetime
+    if not ts:
+        return ""
+    dt = _parse_ts(ts.strip())
     if not dt:
         return ts
     now = datetime.now(dt.tzinfo) if dt.tzinfo else datetime.now()
@@ -68,32 +149,36 @@ def _rel_time(ts: str) -> str:
     days = hours // 24
     return f"{days}d ago"
 
-def pretty_header(kv: dict) -> str:
+def pretty_header(kv) -> str:
+    """Badge/flow/whois/age header; kv is a parse_kv() dict or a LogRecord."""
+    return header_html(kv) + age_chip(kv.get("ts"))
+
+def header_html(kv) -> str:
+    """pretty_header() without the age chip: depends only on the line and hosts.yaml."""
     act = (kv.get("action") or "").lower()
     badge = f'<span class="badge {act}">{html.escape(kv.get("action") or "")}</span>' if act else ""
-    def _is_private(ip: str) -> bool:
-        return ip.startswith("10.") or ip.startswith("192.168.") or (ip.startswith("172.") and 16 <= int(ip.split(".")[1]) <= 31) or ip.startswith("127.")
     src_ip = kv.get("src_ip") or ""
     dst_ip = kv.get("dst_ip") or ""
     src = _map_ip(src_ip) + ((":" + kv.get("sport")) if kv.get("sport") else "")
     dst = _map_ip(dst_ip) + ((":" + kv.get("dport")) if kv.get("dport") else "")
     flow = f'<span class="flow">{html.escape(src)} → {html.escape(dst)}</span>' if (src or dst) else ""
     whois = ""
-    if dst_ip and not _is_private(dst_ip):
+    if dst_ip and not _is_private_ip(dst_ip):
         whois = f' <a class="chip" target="_blank" rel="noreferrer" href="https://rdap.org/ip/{html.escape(dst_ip)}">whois</a>'
-    rel = ""
-    if kv.get("ts"):
-        reltxt = _rel_time(kv.get("ts"))
-        if reltxt:
-            rel = f' <span class="chip muted">{html.escape(reltxt)}</span>'
-    return badge + flow + whois + rel
+    return badge + flow + whois
+
+def age_chip(ts) -> str:
+    """The "5m ago" chip for a timestamp (changes with the clock, so never cached)."""
+    reltxt = _rel_time(ts) if ts else ""
+    return f' <span class="chip muted">{html.escape(reltxt)}</span>' if reltxt else ""
 
 def fold_dupes(lines):
+    """Collapse consecutive identical lines (str or LogRecord) into (line, ×N suffix)."""
     out = []
     last = None
     cnt = 0
-    for ln in lines + [None]:
-        if ln == last:
+    for ln in list(lines) + [None]:
+        if ln is not None and last is not None and getattr(ln, "raw", ln) == getattr(last, "raw", last):
             cnt += 1
             continue
         if last is not None: